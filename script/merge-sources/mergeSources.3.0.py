@@ -1,16 +1,44 @@
 #! /usr/bin/env python3
 # pip install deepmerge charset-normalizer requests
 from deepmerge import Merger
+import copy
+import csv
 import datetime
+import hashlib
 import json
+import os
+import pickle
 import sys
 import re
+import socket
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.retry import Retry
+from collections import Counter
+from functools import lru_cache
+from itertools import chain, count, repeat
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from urllib.parse import urljoin  # [新增] 用于标准路径拼接
+from urllib.parse import urljoin, urlparse  # [新增] 用于标准路径拼接
 
 from charset_normalizer import from_bytes
 
+try:
+    import resource  # 仅用于报告峰值内存，Windows 上不可用
+except ImportError:
+    resource = None
+
+try:
+    import numpy  # 可选，仅用于加速 lives 列式聚合
+except ImportError:
+    numpy = None
+
 
 # 调试常量
 DEBUG_MODE = True
@@ -25,13 +53,175 @@ DEFAULT_OUTPUT_TXT_FILE = "output-txt.txt"
 # ================= [新增] 定义默认覆盖文件名 =================
 DEFAULT_OVERRIDE_FILE = "override.json"
 
+# ================= [新增] 并发抓取配置 =================
+# 全局并发抓取线程数
+FETCH_MAX_WORKERS = 16
+# 单个主机同时进行的最大请求数，避免同一镜像站被瞬间打满
+FETCH_PER_HOST_LIMIT = 4
+# =========================================================
+
+# ================= [新增] 共享 HTTP 客户端配置 =================
+# 缓存的主机连接池数量（每个主机一个连接池）
+HTTP_POOL_CONNECTIONS = 64
+# 每个主机连接池保持的长连接数
+HTTP_POOL_MAXSIZE = FETCH_PER_HOST_LIMIT
+# 失败重试次数及退避系数（连接错误、读取错误及下列状态码）
+HTTP_RETRY_TOTAL = 1
+HTTP_RETRY_BACKOFF = 0.5
+HTTP_RETRY_STATUS = [429, 500, 502, 503, 504]
+# 是否启用 HTTP/2（需要 pip install 'httpx[http2]'，未安装时回退到 requests）
+HTTP2_ENABLED = False
+# =========================================================
+
+# ================= [新增] 流式下载配置 =================
+# 单个响应体的最大字节数，超过则中止下载
+FETCH_MAX_BODY_BYTES = 32 * 1024 * 1024
+# 流式读取的分块大小
+FETCH_CHUNK_SIZE = 64 * 1024
+# 非文本的 Content-Type
+SKIP_CONTENT_TYPES = ['image/', 'video/', 'audio/', 'application/octet-stream', 'application/pdf',
+                      'application/zip', 'application/vnd.android.package-archive',
+                      'application/x-rar', 'application/x-7z', 'application/gzip', 'application/x-gzip']
+# 常见二进制文件头 (文件头正则, 偏移, 类型)
+# 纯 ASCII 的文件头必须写全（含版本字节或子类型），避免误伤以 "FLV"、"ID3"、"RIFF" 等开头的文本播放列表
+BINARY_MAGIC_HEADERS = [
+    (rb'\x89PNG', 0, 'png'), (rb'\xff\xd8\xff', 0, 'jpeg'), (rb'GIF8[79]a', 0, 'gif'), (rb'%PDF-', 0, 'pdf'),
+    (rb'PK\x03\x04', 0, 'zip/apk'), (rb'\x1f\x8b', 0, 'gzip'), (rb'Rar!\x1a\x07', 0, 'rar'),
+    (rb'7z\xbc\xaf', 0, '7z'), (rb'\x1aE\xdf\xa3', 0, 'mkv/webm'), (rb'FLV\x01', 0, 'flv'),
+    (rb'ftyp', 4, 'mp4'), (rb'OggS\x00', 0, 'ogg'), (rb'RIFF.{4}(?:WAVE|AVI |WEBP)', 0, 'riff'),
+    (rb'ID3[\x02-\x04]\x00', 0, 'mp3'), (rb'\x7fELF', 0, 'elf'), (rb'dex\n\d{3}\x00', 0, 'dex')
+]
+# =========================================================
+
+# ================= [新增] 抓取缓存配置 =================
+# 缓存根目录（位于脚本所在的 merge-sources 目录下）
+CACHE_DIR = Path(__file__).resolve().parent / ".cache"
+# 是否启用 HTTP 抓取缓存（条件请求 If-None-Match / If-Modified-Since）
+FETCH_CACHE_ENABLED = True
+FETCH_CACHE_DIR = CACHE_DIR / "fetch"
+# 超过该天数未被重新验证的缓存条目将被淘汰
+FETCH_CACHE_TTL_DAYS = 14
+# 缓存总大小上限，超出时按最近使用时间淘汰
+FETCH_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# =========================================================
+
+# ================= [新增] 分级解码配置 =================
+# 编码检测先只针对前若干字节采样，避免对多 MB 的直播源全文检测；采样结果无法解码全文时再全文检测
+DECODE_SAMPLE_BYTES = 64 * 1024
+# 按 URL 记住检测到的编码，下次运行优先尝试
+ENCODING_MEMORY_FILE = CACHE_DIR / "encodings.json"
+# 字节序标记 (BOM) -> 编码，UTF-32 需要排在 UTF-16 之前判断
+BOM_ENCODINGS = [
+    (b'\xef\xbb\xbf', 'utf-8-sig'),
+    (b'\xff\xfe\x00\x00', 'utf-32'),
+    (b'\x00\x00\xfe\xff', 'utf-32'),
+    (b'\xff\xfe', 'utf-16'),
+    (b'\xfe\xff', 'utf-16')
+]
+# 解码逻辑变化时递增版本号（1 为原始的全文检测解码），解析缓存随之整体失效
+DECODE_VERSION = 3
+# =========================================================
+
+# ================= [新增] 字符串驻留配置 =================
+# 解析后驻留重复出现的字符串（URL、分组名、jar 路径、站点 key 等），减少内存占用
+INGEST_INTERN_STRINGS = True
+# 超过该长度的字符串很少重复，不做驻留
+INGEST_INTERN_MAX_LENGTH = 512
+# =========================================================
+
+# ================= [新增] 解析缓存配置 =================
+# 是否启用按内容哈希的解析缓存（跳过编码检测与 JSON 解析）
+PARSE_CACHE_ENABLED = True
+PARSE_CACHE_FILE = CACHE_DIR / "parse-cache.pickle"
+# 解析逻辑变化时递增版本号，使旧缓存整体失效（解码逻辑的变化由 DECODE_VERSION 单独体现）
+PARSE_CACHE_VERSION = 2
+# =========================================================
+
+# ================= [新增] 失效源负缓存配置 =================
+# 记录每个失效 URL 的失败类型、时间和次数，按指数退避安排重试
+NEGATIVE_CACHE_FILE = CACHE_DIR / "negative-cache.json"
+# 首次失败后的重试间隔（小时），之后每失败一次翻倍
+NEGATIVE_CACHE_BASE_HOURS = 6
+# 最长重试间隔（小时）
+NEGATIVE_CACHE_MAX_HOURS = 24 * 30
+# 输入文件中的直连源连续失败达到该次数后从输入文件永久移除，之后不再重试（除非被某个多仓再次引用）
+NEGATIVE_CACHE_MAX_ATTEMPTS = 6
+# =========================================================
+
+# ================= [新增] 按主机自适应超时配置 =================
+# 持久化的主机延迟统计
+HOST_STATS_FILE = CACHE_DIR / "host-stats.json"
+# 每个主机保留的最近样本数，以及计算自适应超时所需的最少样本数
+HOST_STATS_MAX_SAMPLES = 50
+HOST_STATS_MIN_SAMPLES = 3
+# 未知主机使用的 (连接超时, 读取超时)
+HOST_TIMEOUT_DEFAULT = (5, 10)
+# 自适应超时的下限与上限 (连接超时, 读取超时)
+HOST_TIMEOUT_FLOOR = (1.5, 3)
+HOST_TIMEOUT_CEILING = (10, 30)
+# 连接超时 = 建立连接耗时的 p95 × 倍数，读取超时 = 首字节延迟的 p95 × 倍数（再按上下限截断）
+HOST_TIMEOUT_MULTIPLIER = 3
+# 近期失败率达到该值的主机不使用学习到的超时，恢复默认超时，避免慢而可用的主机因超时过短一直失败
+HOST_FAILING_RATE = 0.8
+# =========================================================
+
+# ================= [新增] 增量合并配置（--incremental 开启） =================
+# 增量合并状态目录：保存按来源前缀划分的合并检查点
+INCREMENTAL_MERGE_DIR = CACHE_DIR / "merge"
+# 每合并多少个来源保存一次检查点（最后一个来源总会保存）
+INCREMENTAL_CHECKPOINT_INTERVAL = 16
+# 合并逻辑变化时递增版本号，使旧检查点整体失效
+INCREMENTAL_MERGE_VERSION = 3
+# =========================================================
+
+# ================= [新增] 规范化输出配置 =================
+# 规范化输出：按固定规则排序列表并按键名排序序列化，相同数据总是生成相同字节（也可用 --canonical 开启）
+CANONICAL_OUTPUT = False
+# 规范化输出时按元素标识排序的列表路径
+CANONICAL_SORTED_LISTS = ['sites', 'video.sites', 'parses', 'rules']
+# =========================================================
+
+# ================= [新增] lives 聚合引擎配置 =================
+# URL -> 分组/频道 计数所用的引擎：columnar 为整数编码的列式计数，dict 为原有的嵌套字典统计，
+# auto 在安装了 NumPy 时使用 columnar，否则使用 dict（纯 Python 的列式计数在每个频道只有 1~2 个 URL 时并不比 dict 快）
+LIVES_AGGREGATION_ENGINE = 'auto'
+# =========================================================
+
+# ================= [新增] lives 播放列表批量展开配置 =================
+# 播放列表内容总字符数达到该值且有多个播放列表时，放入进程池解析
+LIVES_PLAYLIST_PROCESS_MIN_CHARS = 2000000
+# 解析播放列表的最大进程数
+LIVES_PLAYLIST_PARSE_MAX_WORKERS = os.cpu_count() or 1
+# =========================================================
+
+# ================= [新增] 名称清洗配置 =================
+# 每个清洗器缓存的不同名称数（LRU），分组名和频道名各一份
+NAME_CLEAN_CACHE_SIZE = 65536
+# =========================================================
+
+# ================= [新增] 多仓展开配置 =================
+# 多仓嵌套展开的最大深度，顶层多仓为第 1 层
+MULTI_REPO_MAX_DEPTH = 3
+# =========================================================
+
 # ================= [新增] 定义 URL 替换映射 =================
+# 按顺序依次应用，前一条规则的结果作为后一条规则的输入
+# type: "regex"（默认，只替换第一处匹配）或 "prefix"（纯前缀替换，连续的前缀规则合并为前缀树，最长前缀优先）
+# contains: 可选，字符串中必须包含该子串才尝试正则，用于快速跳过
 URL_REPLACEMENTS = [
     {
-        "old": r".*https://raw\.githubusercontent\.com",
-        "new": "https://rawgithubusercontent.cnfaq.cn"
+        "old": r'[^"]*https://raw\.githubusercontent\.com',
+        "new": "https://rawgithubusercontent.cnfaq.cn",
+        "contains": "https://raw.githubusercontent.com"
     }
 ]
+# 输出前重命名的字段名（目标字段已存在时不重命名，不覆盖已有值）
+KEY_RENAMES = {
+    "jiexiUrl": "playUrl"
+}
+# 是否在写出前按 URL_REPLACEMENTS / KEY_RENAMES 重写合并结果（也可用 --rewrite-output 开启）
+# 默认关闭：update.sh 中的 sed 只处理本目录下的 tv*.json，从未修改写出的 web/tv.json，开启后输出会发生变化
+OUTPUT_REWRITE_ENABLED = False
 # =========================================================
 
 # ================= [新增] 定义多余字段列表 =================
@@ -67,11 +257,143 @@ GROUP_NAME_CLEAN_KEYWORDS = ['频道', '丨', '｜', '·', '-', '_', ';', '.', '
 DEBUG_ORIGINAL_LIVES_FILE = 'debug_original_lives.json'
 DEBUG_VALID_LIVES_FILE = 'debug_valid_lives.json'
 
-def remove_comments_from_string(input_string):
-    input_string = re.sub(r'^[ ]*//[^\n]*', '', input_string, flags=re.MULTILINE)
-    input_string = re.sub(r'^[ ]*#[^\n]*', '', input_string, flags=re.MULTILINE)
-    input_string = re.sub(r'^[ ]*/\*.*?\*/', '', input_string, flags=re.DOTALL)
-    return input_string
+# ================= [新增] JSONC 两阶段解析 =================
+# 清理阶段的正则一次扫描同时识别：字符串字面量（原样保留）、// # /* */ 注释、尾随逗号
+# 块注释只匹配到第一个 */，避免在前瞻回溯时跨越多个注释
+_JSONC_COMMENT = r'//[^\n]*|\#[^\n]*|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/'
+_JSONC_TOKEN_RE = re.compile(
+    r'(?P<string>"[^"\\]*(?:\\.[^"\\]*)*")'
+    r'|(?P<comment>' + _JSONC_COMMENT + r')'
+    r'|(?P<comma>,(?=(?:\s|' + _JSONC_COMMENT + r')*[\]}]))'
+)
+
+def _jsonc_replace(match):
+    string = match.group('string')
+    if string is None:
+        # 注释与尾随逗号直接删除
+        return ''
+    # 与旧逻辑一致：字符串中的换行符被去除
+    if '\n' in string or '\r' in string:
+        return string.replace('\n', '').replace('\r', '')
+    return string
+
+def parse_jsonc(text):
+    """
+    解析带注释的 JSON (JSONC)，分两个阶段：
+    1. 先按严格 JSON 直接解析（大多数来源是合法 JSON，只需一次 C 层解析）；
+    2. 失败时用正则一次扫描去除字符串字面量之外的注释和尾随逗号，再解析一次。
+    因此 JSONC 输入会经过：一次在首个错误处中止的 json.loads、一次正则扫描、一次 json.loads，
+    并不是单遍的分词解析器。
+    接受的语法比旧的 remove_comments_from_string 更宽：旧逻辑只删除行首（前面只有空格）的
+    // # /* */ 注释，这里在字符串之外任何位置的注释都会删除，例如行尾或值之后的 # 注释
+    （'{"url":"x"}#tail' 现在可以解析），另外允许尾随逗号；
+    字符串中的 "//"、"#"（如 URL）不受影响
+    :param text: str
+    :return: 解析后的对象
+    :raises ValueError: 非法 JSON
+    """
+    if text.startswith('\ufeff'):
+        text = text[1:]
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    return json.loads(_JSONC_TOKEN_RE.sub(_jsonc_replace, text), strict=False)
+# =========================================================
+
+# ================= [新增] URL 重写引擎 =================
+class PrefixTrie:
+    """
+    纯前缀替换规则的前缀树，一次扫描找到最长匹配前缀
+    """
+    def __init__(self):
+        self.root = {}
+
+    def add(self, prefix, replacement):
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[None] = replacement
+
+    def rewrite(self, text):
+        node = self.root
+        match = None
+        for i, char in enumerate(text):
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                match = (i + 1, node[None])
+        if match is None:
+            return text
+        return match[1] + text[match[0]:]
+
+class UrlRewriter:
+    """
+    将 URL_REPLACEMENTS 与 KEY_RENAMES 预编译为有序的重写阶段
+    既用于抓取前的 URL 预处理，也用于输出前对合并结果的整树重写
+    """
+    def __init__(self, replacements, key_renames=None):
+        self.stages = []
+        for rule in replacements:
+            if rule.get("type", "regex") == "prefix":
+                if not self.stages or not isinstance(self.stages[-1], PrefixTrie):
+                    self.stages.append(PrefixTrie())
+                self.stages[-1].add(rule["old"], rule["new"])
+            else:
+                self.stages.append((re.compile(rule["old"]), rule["new"], rule.get("contains")))
+        self.key_renames = dict(key_renames or {})
+        self.rewritten_values = 0
+        self.renamed_keys = 0
+
+    def rewrite(self, text):
+        for stage in self.stages:
+            if isinstance(stage, PrefixTrie):
+                text = stage.rewrite(text)
+                continue
+            pattern, replacement, contains = stage
+            if contains is not None and contains not in text:
+                continue
+            # 使用函数替换，避免 replacement 中的反斜杠被解释为分组引用
+            text = pattern.sub(lambda _: replacement, text, count=1)
+        return text
+
+    def rewrite_tree(self, obj):
+        """
+        递归重写对象中的所有字符串值，并按 KEY_RENAMES 重命名字段
+        列表与字典原地修改，字符串返回新值
+        """
+        if isinstance(obj, str):
+            new_value = self.rewrite(obj)
+            if new_value != obj:
+                self.rewritten_values += 1
+            return new_value
+        if isinstance(obj, list):
+            for i, item in enumerate(obj):
+                obj[i] = self.rewrite_tree(item)
+            return obj
+        if isinstance(obj, dict):
+            if self.key_renames and any(key in self.key_renames for key in obj):
+                # 保持字段顺序重建字典；目标字段已存在时保留原字段名，不覆盖已有值
+                items = list(obj.items())
+                existing_keys = set(obj)
+                obj.clear()
+                for key, value in items:
+                    new_key = self.key_renames.get(key)
+                    if new_key is not None and new_key not in existing_keys and new_key not in obj:
+                        key = new_key
+                        self.renamed_keys += 1
+                    obj[key] = value
+            for key, value in obj.items():
+                obj[key] = self.rewrite_tree(value)
+            return obj
+        return obj
+
+    def print_summary(self):
+        print(f"[UrlRewrite] 输出重写：替换字符串 {self.rewritten_values} 处，重命名字段 {self.renamed_keys} 处")
+
+URL_REWRITER = UrlRewriter(URL_REPLACEMENTS, KEY_RENAMES)
+# =========================================================
 
 def preprocess_url(url):
     """
@@ -79,116 +401,1114 @@ def preprocess_url(url):
     :param url: 原始URL
     :return: 替换后的URL
     """
-    processed_url = url
-    for replacement in URL_REPLACEMENTS:
-        if replacement["old"] in processed_url:
-            old_url = processed_url
-            processed_url = processed_url.replace(replacement["old"], replacement["new"])
-            print(f"  [URL Replace] {old_url} -> {processed_url}")
+    processed_url = URL_REWRITER.rewrite(url)
+    if processed_url != url:
+        print(f"  [URL Replace] {url} -> {processed_url}")
     return processed_url
 
 
-def is_json(content):
-    try:
-        json.loads(content)
-    except ValueError:
-        return False
-    return True
+# ================= [新增] 来源耗时与大小报告 =================
+# 报告列：耗时单位为毫秒，多次连接/请求（重试、304 后重新下载）累加
+SOURCE_REPORT_FIELDS = ['source', 'status', 'http_status', 'dns_ms', 'connect_ms', 'ttfb_ms', 'total_ms',
+                        'bytes', 'decode_ms', 'encoding', 'parse_ms', 'parse_cache']
+SOURCE_REPORT_TIMING_FIELDS = {'dns_ms', 'connect_ms', 'ttfb_ms', 'total_ms', 'decode_ms', 'parse_ms'}
+
+class SourceReport:
+    """
+    记录每个来源的 DNS/连接/首字节/总耗时、下载字节数、解码与解析耗时及最终状态
+    连接层的计时通过线程局部变量归属到当前正在抓取的来源
+    """
+    def __init__(self):
+        self.rows = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def set_current(self, source):
+        self.local.source = source
+
+    def current(self):
+        return getattr(self.local, 'source', None)
+
+    def update(self, source, **fields):
+        if source is None:
+            return
+        with self.lock:
+            self.rows.setdefault(source, {}).update(fields)
+
+    def add_timing(self, field, seconds, source=None):
+        """
+        累加一项耗时（秒），未指定来源时归属到当前线程正在抓取的来源
+        """
+        source = source if source is not None else self.current()
+        if source is None:
+            return
+        with self.lock:
+            row = self.rows.setdefault(source, {})
+            row[field] = row.get(field, 0.0) + seconds
+
+    def write(self, file_path):
+        """
+        写出 CSV 报告，按总耗时从高到低排序
+        未显式记录状态的来源（如直播列表）按抓取失败原因或 ok 填写
+        """
+        if not self.rows:
+            return
+        rows = []
+        for source, row in self.rows.items():
+            out = {'source': source}
+            for field in SOURCE_REPORT_FIELDS[1:]:
+                value = row.get(field, '')
+                if field in SOURCE_REPORT_TIMING_FIELDS and value != '':
+                    value = round(value * 1000, 1)
+                out[field] = value
+            if not out['status']:
+                out['status'] = FETCH_FAILURE_REASONS.get(source, 'ok')
+            rows.append(out)
+        rows.sort(key=lambda r: (-(r['total_ms'] or 0), r['source']))
+        try:
+            with open(file_path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=SOURCE_REPORT_FIELDS)
+                writer.writeheader()
+                writer.writerows(rows)
+            print(f"[SourceReport] 来源耗时报告已写入: {file_path} ({len(rows)} 条)")
+        except OSError as e:
+            print(f"[SourceReport] 写入报告失败 {file_path}: {e}")
+
+SOURCE_REPORT = SourceReport()
+# =========================================================
 
-def detect_encoding(byte_data):
+# ================= [新增] 分级解码 =================
+class EncodingMemory:
+    """
+    记录每个 URL 上次检测到的编码，并统计各解码层级的使用次数
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.encodings = None
+        self.lock = threading.Lock()
+        self.changed = False
+        self.tier_stats = {'bom': 0, 'utf-8': 0, 'remembered': 0, 'sample-detect': 0, 'full-detect': 0,
+                           'fallback': 0}
+
+    def _ensure_loaded(self):
+        if self.encodings is not None:
+            return
+        self.encodings = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.encodings = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def get(self, url):
+        with self.lock:
+            self._ensure_loaded()
+            return self.encodings.get(url)
+
+    def remember(self, url, encoding):
+        with self.lock:
+            self._ensure_loaded()
+            if self.encodings.get(url) != encoding:
+                self.encodings[url] = encoding
+                self.changed = True
+
+    def count(self, tier):
+        with self.lock:
+            self.tier_stats[tier] += 1
+
+    def save(self):
+        if not self.changed:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.encodings, f, ensure_ascii=False, indent=1)
+        except OSError as e:
+            print(f"[Decode] 保存编码记录失败: {e}")
+
+    def print_summary(self):
+        stats = ', '.join(f"{tier} {count}" for tier, count in self.tier_stats.items())
+        print(f"[Decode] 解码层级统计：{stats}")
+
+ENCODING_MEMORY = EncodingMemory(ENCODING_MEMORY_FILE)
+
+def detect_encoding(byte_data, sample_size=None):
     """
     检测字节流的编码 (使用 charset-normalizer)
     :param byte_data: bytes
+    :param sample_size: 只检测前若干字节，None 表示检测全文
     :return: str 编码名称
     """
     if not byte_data:
         return 'utf-8'
 
     # 使用 charset-normalizer 进行检测
-    result = from_bytes(byte_data).best()
+    result = from_bytes(byte_data[:sample_size] if sample_size else byte_data).best()
 
     # 如果检测到结果，直接使用其编码；否则默认 utf-8
     if result:
         return result.encoding
     return 'utf-8'
+# =========================================================
+
+_BINARY_MAGIC_PATTERNS = [(re.compile(magic, re.DOTALL), offset, kind) for magic, offset, kind in BINARY_MAGIC_HEADERS]
+
+def sniff_binary(head):
+    """
+    根据文件头判断是否为二进制内容
+    :param head: 内容开头的字节
+    :return: 二进制类型名，非二进制返回 None
+    """
+    for pattern, offset, kind in _BINARY_MAGIC_PATTERNS:
+        if pattern.match(head, offset):
+            return kind
+    return None
 
-def decode_safely(byte_data):
+def decode_safely(byte_data, url=None):
     """
-    安全解码字节流为字符串
+    安全解码字节流为字符串，并在来源报告中记录解码耗时与编码
     :param byte_data: bytes
+    :param url: 来源 URL（可选，用于记住检测到的编码）
     :return: str or None
     """
+    start_time = time.monotonic()
+    content, encoding = decode_with_encoding(byte_data, url)
+    if url and byte_data:
+        SOURCE_REPORT.update(url, encoding=encoding or '')
+        SOURCE_REPORT.add_timing('decode_ms', time.monotonic() - start_time, url)
+    return content
+
+def decode_with_encoding(byte_data, url=None):
+    """
+    依次尝试：BOM -> 严格 UTF-8 -> 该 URL 上次检测到的编码 -> 采样检测编码 -> 全文检测编码 -> UTF-8 容错
+    只有能无错解码全文的检测结果才会被记住
+    :param byte_data: bytes
+    :param url: 来源 URL（可选，用于记住检测到的编码）
+    :return: (str or None, 使用的编码 or None)
+    """
     if not byte_data:
-        return None
+        return None, None
 
     # 1. 简单的二进制文件检查 (例如 PNG header 0x89504E47, JPEG header 0xFFD8FF)
     # 如果是图片等明显的二进制，直接返回 None
-    if len(byte_data) > 4:
-        header = byte_data[:4]
-        # PNG, JPEG, GIF, PDF, ZIP 等常见二进制头
-        binary_headers = [
-            b'\x89PNG', b'\xff\xd8\xff', b'GIF8', b'%PDF', b'PK\x03\x04'
-        ]
-        for bh in binary_headers:
-            if header.startswith(bh):
-                print("  [Skip] 检测到二进制文件头，跳过解码。")
-                return None
-
-    encoding = detect_encoding(byte_data)
+    if sniff_binary(byte_data):
+        print("  [Skip] 检测到二进制文件头，跳过解码。")
+        return None, None
 
+    # 2. BOM
+    for bom, bom_encoding in BOM_ENCODINGS:
+        if byte_data.startswith(bom):
+            try:
+                content = byte_data.decode(bom_encoding)
+                ENCODING_MEMORY.count('bom')
+                return content, bom_encoding
+            except UnicodeDecodeError:
+                break
+
+    # 3. 严格 UTF-8
     try:
-        # 尝试用检测到的编码解码
-        return byte_data.decode(encoding)
-    except (UnicodeDecodeError, LookupError):
+        content = byte_data.decode('utf-8')
+        ENCODING_MEMORY.count('utf-8')
+        return content, 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    # 4. 上次运行检测到的编码
+    remembered = ENCODING_MEMORY.get(url) if url else None
+    if remembered:
         try:
-            # 失败则尝试 UTF-8 容错
-            return byte_data.decode('utf-8', errors='replace')
-        except Exception:
-            return None
+            content = byte_data.decode(remembered)
+            ENCODING_MEMORY.count('remembered')
+            return content, remembered
+        except (UnicodeDecodeError, LookupError):
+            pass
+
+    # 5. 采样检测编码；6. 采样结果无法解码全文时（如开头全是 ASCII），与原实现一样全文检测
+    tiers = [('sample-detect', DECODE_SAMPLE_BYTES)]
+    if len(byte_data) > DECODE_SAMPLE_BYTES:
+        tiers.append(('full-detect', None))
+    tried = set()
+    for tier, sample_size in tiers:
+        encoding = detect_encoding(byte_data, sample_size)
+        if encoding in tried:
+            continue
+        tried.add(encoding)
+        try:
+            # 尝试用检测到的编码解码
+            content = byte_data.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            continue
+        ENCODING_MEMORY.count(tier)
+        if url:
+            ENCODING_MEMORY.remember(url, encoding)
+        return content, encoding
 
-def get_local_file_content(file_path):
     try:
-        # 以二进制模式读取
+        # 失败则尝试 UTF-8 容错
+        content = byte_data.decode('utf-8', errors='replace')
+        ENCODING_MEMORY.count('fallback')
+        return content, 'utf-8 (replace)'
+    except Exception:
+        return None, None
+
+def get_local_file_bytes(file_path):
+    """
+    以二进制模式读取本地文件
+    :param file_path: 文件路径
+    :return: bytes or None
+    """
+    try:
+        start_time = time.monotonic()
         with open(file_path, 'rb') as file:
             byte_content = file.read()
+        SOURCE_REPORT.add_timing('total_ms', time.monotonic() - start_time, file_path)
+        SOURCE_REPORT.update(file_path, bytes=len(byte_content))
         print(f"Read local file: {file_path}")
-
-        # 解码
-        content = decode_safely(byte_content)
-        return content
+        return byte_content
     except Exception as e:
         print(f"Error reading local file {file_path}: {e}")
+        record_fetch_failure(file_path, f"read error: {e}")
         return None
 
-def get_url_content(url, timeout=10):
+def get_local_file_content(file_path):
+    byte_content = get_local_file_bytes(file_path)
+    if byte_content is None:
+        return None
+
+    # 解码
+    return decode_safely(byte_content, file_path)
+
+# ================= [新增] 按主机限制并发 =================
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+def get_host_semaphore(url):
+    """
+    获取 URL 所属主机的并发信号量
+    :param url: URL
+    :return: threading.BoundedSemaphore
+    """
+    host = urlparse(url).netloc.lower()
+    with _host_semaphores_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(FETCH_PER_HOST_LIMIT)
+            _host_semaphores[host] = semaphore
+    return semaphore
+
+def fetch_concurrently(items, fetch_func, max_workers=None):
+    """
+    使用线程池并发执行抓取函数，结果按输入顺序返回
+    :param items: 待抓取的参数列表
+    :param fetch_func: 抓取函数，接收单个参数
+    :param max_workers: 最大线程数，默认使用 FETCH_MAX_WORKERS
+    :return: 与 items 一一对应的结果列表
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    workers = min(max_workers or FETCH_MAX_WORKERS, len(items))
+    if workers <= 1:
+        return [fetch_func(item) for item in items]
+
+    # executor.map 按提交顺序返回结果，保证输出顺序确定
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fetch_func, items))
+# =========================================================
+
+# ================= [新增] 共享 HTTP 客户端 =================
+_http_client = None
+_http_client_lock = threading.Lock()
+
+class TimedConnectionMixin:
+    """
+    为 urllib3 连接分别计时 DNS 解析与建立连接（TCP + TLS），计入来源报告
+    """
+    def _new_conn(self):
+        start_time = time.monotonic()
+        dns_host = self._dns_host
+        try:
+            addresses = list(dict.fromkeys(info[4][0] for info in
+                                           socket.getaddrinfo(dns_host, self.port, 0, socket.SOCK_STREAM)))
+        except OSError:
+            # 解析失败交给 urllib3 按原逻辑抛出异常
+            addresses = []
+        self._dns_seconds = time.monotonic() - start_time
+        SOURCE_REPORT.add_timing('dns_ms', self._dns_seconds)
+        if not addresses:
+            return super()._new_conn()
+
+        # 依次尝试解析到的地址，与 socket.create_connection 的行为一致
+        last_error = None
+        try:
+            for address in addresses:
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except ConnectTimeoutError as e:
+                    last_error = e
+            raise last_error
+        finally:
+            self._dns_host = dns_host
+
+    def connect(self):
+        start_time = time.monotonic()
+        self._dns_seconds = 0.0
+        connected = False
+        try:
+            super().connect()
+            connected = True
+        finally:
+            connect_seconds = time.monotonic() - start_time - self._dns_seconds
+            SOURCE_REPORT.add_timing('connect_ms', connect_seconds)
+            if connected:
+                HOST_STATS.note_connect(connect_seconds)
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    pass
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class HttpxResponse:
+    """
+    将 httpx 响应包装为与 requests 一致的接口，异常统一转换为 requests 异常
+    """
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+
+    def iter_content(self, chunk_size):
+        import httpx
+        try:
+            yield from self._response.iter_bytes(chunk_size)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(str(e)) from e
+        except httpx.HTTPError as e:
+            raise requests.RequestException(str(e)) from e
+
+    def close(self):
+        self._response.close()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self._response.url}")
+
+def create_http_client():
+    """
+    创建共享 HTTP 客户端：按主机复用连接池、保持长连接、按策略自动重试
+    :return: httpx.Client (HTTP/2) 或 requests.Session
+    """
+    if HTTP2_ENABLED:
+        try:
+            import httpx
+            limits = httpx.Limits(max_connections=HTTP_POOL_CONNECTIONS * HTTP_POOL_MAXSIZE,
+                                  max_keepalive_connections=HTTP_POOL_CONNECTIONS * HTTP_POOL_MAXSIZE)
+            transport = httpx.HTTPTransport(http2=True, retries=HTTP_RETRY_TOTAL, limits=limits)
+            client = httpx.Client(transport=transport, follow_redirects=True)
+            print("[HTTP] 使用 httpx 客户端 (HTTP/2)")
+            return client
+        except ImportError as e:
+            print(f"[HTTP] httpx[http2] 不可用，回退到 requests: {e}")
+
+    retry = Retry(total=HTTP_RETRY_TOTAL, backoff_factor=HTTP_RETRY_BACKOFF,
+                  status_forcelist=HTTP_RETRY_STATUS, allowed_methods=frozenset(['GET', 'HEAD']),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                          max_retries=retry)
+    # 使用带计时的连接，用于来源报告中的 DNS/连接耗时
+    adapter.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool,
+                                                  'https': TimedHTTPSConnectionPool}
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def get_http_client():
+    """
+    获取进程内共享的 HTTP 客户端（首次调用时创建）
+    """
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = create_http_client()
+    return _http_client
+
+def http_get(url, timeout, headers=None):
+    """
+    使用共享客户端发起流式 GET 请求，调用方需读取响应体后 close()
+    :param url: URL
+    :param timeout: 超时秒数，或 (连接超时, 读取超时)
+    :param headers: 额外请求头
+    :return: requests.Response 或 HttpxResponse
+    """
+    client = get_http_client()
+    if isinstance(client, requests.Session):
+        return client.get(url, timeout=timeout, headers=headers, stream=True)
+
+    import httpx
+    if isinstance(timeout, tuple):
+        timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+    try:
+        request = client.build_request('GET', url, headers=headers, timeout=timeout)
+        return HttpxResponse(client.send(request, stream=True))
+    except httpx.TimeoutException as e:
+        raise requests.Timeout(str(e)) from e
+    except httpx.TransportError as e:
+        raise requests.ConnectionError(str(e)) from e
+    except httpx.HTTPError as e:
+        raise requests.RequestException(str(e)) from e
+# =========================================================
+
+# ================= [新增] 磁盘抓取缓存 =================
+class FetchCache:
+    """
+    基于磁盘的 HTTP 抓取缓存
+    以改写后的 URL 为键，保存响应体及 ETag/Last-Modified，下次抓取时发送条件请求
+    """
+    def __init__(self, cache_dir, ttl_days, max_bytes):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_days * 86400
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # hit: 条件请求返回 304；miss: 有缓存条目但服务端返回了新内容；uncached: 无缓存条目的抓取
+        self.stats = {'hit': 0, 'miss': 0, 'uncached': 0, 'stored': 0, 'expired': 0, 'evicted': 0}
+
+    def _paths(self, url):
+        return self._key_paths(hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def _key_paths(self, key):
+        return self.cache_dir / f"{key}.body", self.cache_dir / f"{key}.meta.json"
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _write_meta(self, meta_path, meta):
+        tmp_path = meta_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        tmp_path.replace(meta_path)
+
+    def lookup(self, url):
+        """
+        查找缓存条目，过期条目会被删除
+        :param url: 改写后的 URL
+        :return: 元数据 dict 或 None
+        """
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - meta.get('validated_at', 0) > self.ttl_seconds or not body_path.exists():
+            self._remove(url)
+            self._count('expired')
+            return None
+        return meta
+
+    def conditional_headers(self, meta):
+        """
+        根据缓存元数据构造条件请求头
+        """
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def load(self, url, meta):
+        """
+        服务端返回 304 时读取缓存的响应体，并刷新验证时间
+        :return: bytes 或 None
+        """
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(body_path, 'rb') as f:
+                body = f.read()
+            meta['validated_at'] = time.time()
+            self._write_meta(meta_path, meta)
+        except OSError as e:
+            print(f"  [Cache] 读取缓存失败 {url}: {e}")
+            return None
+        self._count('hit')
+        return body
+
+    def store(self, url, body, response_headers, had_entry=False):
+        """
+        保存响应体及校验头；服务端未提供 ETag/Last-Modified 时不缓存
+        :param had_entry: 抓取前是否存在缓存条目（存在时计为未命中，否则计为无缓存）
+        """
+        self._count('miss' if had_entry else 'uncached')
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+
+        body_path, meta_path = self._paths(url)
+        now = time.time()
+        meta = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'size': len(body),
+            'fetched_at': now,
+            'validated_at': now
+        }
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = body_path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            tmp_path.replace(body_path)
+            self._write_meta(meta_path, meta)
+            self._count('stored')
+        except OSError as e:
+            print(f"  [Cache] 写入缓存失败 {url}: {e}")
+
+    def _remove(self, url):
+        self._remove_key(hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def _remove_key(self, key):
+        for path in self._key_paths(key):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def evict(self):
+        """
+        淘汰过期条目，并在总大小超过上限时按最近验证时间从旧到新删除
+        """
+        if not self.cache_dir.exists():
+            return
+
+        entries = []
+        now = time.time()
+        # 以文件名中的哈希为键删除，元数据损坏或缺少 url 时也能连同响应体一起删除
+        for meta_path in self.cache_dir.glob('*.meta.json'):
+            key = meta_path.name[:-len('.meta.json')]
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                self._remove_key(key)
+                continue
+            if not isinstance(meta, dict) or now - meta.get('validated_at', 0) > self.ttl_seconds:
+                self._remove_key(key)
+                self.stats['expired'] += 1
+                continue
+            entries.append((key, meta))
+
+        # 没有对应元数据的响应体（如写入中断）同样删除
+        for body_path in self.cache_dir.glob('*.body'):
+            if not body_path.with_name(f"{body_path.stem}.meta.json").exists():
+                body_path.unlink(missing_ok=True)
+
+        total_size = sum(meta.get('size', 0) for _, meta in entries)
+        entries.sort(key=lambda entry: entry[1].get('validated_at', 0))
+        for key, meta in entries:
+            if total_size <= self.max_bytes:
+                break
+            self._remove_key(key)
+            total_size -= meta.get('size', 0)
+            self.stats['evicted'] += 1
+
+    def print_summary(self):
+        stats = self.stats
+        total = stats['hit'] + stats['miss']
+        hit_rate = stats['hit'] / total * 100 if total else 0
+        print(f"[Cache] 抓取缓存：命中(304) {stats['hit']}，未命中 {stats['miss']}，命中率 {hit_rate:.1f}%，"
+              f"无缓存 {stats['uncached']}，新写入 {stats['stored']}，过期 {stats['expired']}，淘汰 {stats['evicted']}")
+
+FETCH_CACHE = FetchCache(FETCH_CACHE_DIR, FETCH_CACHE_TTL_DAYS, FETCH_CACHE_MAX_BYTES)
+# =========================================================
+
+# ================= [新增] 按主机自适应超时 =================
+def percentile(sorted_values, q):
+    """
+    计算已排序列表的分位数（最近秩）
+    """
+    if not sorted_values:
+        return None
+    return sorted_values[int(round((len(sorted_values) - 1) * q))]
+
+class HostStats:
+    """
+    持久化的主机延迟统计：最近的建立连接耗时、首字节延迟样本与成功/失败记录
+    用于为每个主机计算连接超时（按建立连接耗时）与读取超时（按首字节延迟）
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.hosts = None
+        self.lock = threading.Lock()
+        # 连接层记录的建立连接耗时，通过线程局部变量交给当前线程正在进行的请求
+        self.local = threading.local()
+
+    def _ensure_loaded(self):
+        if self.hosts is not None:
+            return
+        self.hosts = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.hosts = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def _host_entry(self, host):
+        self._ensure_loaded()
+        entry = self.hosts.setdefault(host, {'latencies': [], 'outcomes': []})
+        entry.setdefault('connect_latencies', [])
+        return entry
+
+    def begin_request(self):
+        """
+        在当前线程发起请求前调用，清除上一次请求的建立连接耗时
+        """
+        self.local.connect_seconds = None
+
+    def note_connect(self, seconds):
+        """
+        由连接层调用：记录当前线程新建连接的耗时（复用长连接时不会调用）
+        """
+        self.local.connect_seconds = seconds
+
+    def record_latency(self, host, seconds):
+        """
+        记录一次收到响应头的请求：首字节延迟，以及本次请求新建连接时的建立连接耗时
+        """
+        connect_seconds = getattr(self.local, 'connect_seconds', None)
+        with self.lock:
+            entry = self._host_entry(host)
+            entry['latencies'] = (entry['latencies'] + [round(seconds, 3)])[-HOST_STATS_MAX_SAMPLES:]
+            if connect_seconds is not None:
+                entry['connect_latencies'] = (entry['connect_latencies']
+                                              + [round(connect_seconds, 3)])[-HOST_STATS_MAX_SAMPLES:]
+
+    def record_outcome(self, host, success):
+        """
+        记录一次请求的最终结果（连接失败、5xx、读取响应体出错均为失败）
+        """
+        with self.lock:
+            entry = self._host_entry(host)
+            entry['outcomes'] = (entry['outcomes'] + [1 if success else 0])[-HOST_STATS_MAX_SAMPLES:]
+
+    def _summarize(self, entry):
+        latencies = sorted(entry['latencies'])
+        connect_latencies = sorted(entry.get('connect_latencies', []))
+        outcomes = entry['outcomes']
+        failure_rate = outcomes.count(0) / len(outcomes) if outcomes else 0.0
+        p50 = percentile(latencies, 0.5)
+        p95 = percentile(latencies, 0.95)
+        connect_p95 = percentile(connect_latencies, 0.95)
+
+        timeout = list(HOST_TIMEOUT_DEFAULT)
+        # 近期经常失败的主机使用默认超时：失败可能正是学习到的超时过短造成的，恢复后可重新学习
+        if not (len(outcomes) >= HOST_STATS_MIN_SAMPLES and failure_rate >= HOST_FAILING_RATE):
+            for i, samples, value in ((0, connect_latencies, connect_p95), (1, latencies, p95)):
+                if len(samples) >= HOST_STATS_MIN_SAMPLES:
+                    timeout[i] = min(max(value * HOST_TIMEOUT_MULTIPLIER, HOST_TIMEOUT_FLOOR[i]),
+                                     HOST_TIMEOUT_CEILING[i])
+        return {
+            'samples': len(outcomes),
+            'p50': p50,
+            'p95': p95,
+            'connect_p95': connect_p95,
+            'failure_rate': round(failure_rate, 3),
+            'connect_timeout': round(timeout[0], 2),
+            'read_timeout': round(timeout[1], 2)
+        }
+
+    def get_timeout(self, host):
+        """
+        获取主机的 (连接超时, 读取超时)
+        """
+        with self.lock:
+            self._ensure_loaded()
+            entry = self.hosts.get(host)
+            if entry is None:
+                return HOST_TIMEOUT_DEFAULT
+            summary = self._summarize(entry)
+        return summary['connect_timeout'], summary['read_timeout']
+
+    def save(self):
+        if self.hosts is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.hosts, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"[HostStats] 保存失败: {e}")
+
+    def write_report(self, file_path):
+        """
+        输出各主机的延迟统计与超时设置，按 p95 延迟从高到低排序
+        """
+        if not self.hosts:
+            return
+        report = {host: self._summarize(entry) for host, entry in self.hosts.items()}
+        report = dict(sorted(report.items(), key=lambda item: (-(item[1]['p95'] or 0), item[0])))
+        try:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"[HostStats] 主机超时报告已写入: {file_path}")
+        except OSError as e:
+            print(f"[HostStats] 写入报告失败 {file_path}: {e}")
+
+HOST_STATS = HostStats(HOST_STATS_FILE)
+# =========================================================
+
+# ================= [新增] 流式下载与失败原因记录 =================
+class FetchAborted(Exception):
+    """
+    下载被提前中止（非文本内容或超过大小上限）
+    """
+
+# 本次运行中抓取失败的原因: 原始 URL -> 原因
+FETCH_FAILURE_REASONS = {}
+_fetch_failure_lock = threading.Lock()
+
+def record_fetch_failure(url, reason):
+    with _fetch_failure_lock:
+        FETCH_FAILURE_REASONS[url] = reason
+
+def get_invalid_reason(source):
+    """
+    获取无效源的原因，用于无效源报告
+    """
+    if source in FETCH_FAILURE_REASONS:
+        return FETCH_FAILURE_REASONS[source]
+    if not source.startswith(('/', '.', 'http')):
+        return "unsupported source"
+    return "invalid json"
+
+def read_response_body(response):
+    """
+    流式读取响应体：先检查 Content-Type/Content-Length，再根据首个分块的文件头判断二进制，
+    并在超过 FETCH_MAX_BODY_BYTES 时中止
+    :param response: 流式响应
+    :return: bytes
+    """
+    content_type = response.headers.get('Content-Type', '').lower()
+    if any(t in content_type for t in SKIP_CONTENT_TYPES):
+        raise FetchAborted(f"non-text content-type: {content_type}")
+
+    content_length = response.headers.get('Content-Length', '')
+    if content_length.isdigit() and int(content_length) > FETCH_MAX_BODY_BYTES:
+        raise FetchAborted(f"body too large: Content-Length {content_length}")
+
+    chunks = []
+    total_size = 0
+    for chunk in response.iter_content(FETCH_CHUNK_SIZE):
+        if not chunk:
+            continue
+        if not chunks:
+            binary_kind = sniff_binary(chunk)
+            if binary_kind:
+                raise FetchAborted(f"binary content: {binary_kind}")
+        total_size += len(chunk)
+        if total_size > FETCH_MAX_BODY_BYTES:
+            raise FetchAborted(f"body too large: over {FETCH_MAX_BODY_BYTES} bytes")
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+def download_url(url, timeout, headers=None):
+    """
+    下载 URL（调用方需持有主机信号量），同时记录主机延迟统计与来源报告
+    :return: (状态码, 响应头, 响应体)，304 时响应体为 None
+    """
+    host = urlparse(url).netloc.lower()
+    start_time = time.monotonic()
+    HOST_STATS.begin_request()
+    try:
+        response = http_get(url, timeout=timeout, headers=headers)
+    except (requests.Timeout, requests.ConnectionError):
+        HOST_STATS.record_outcome(host, False)
+        SOURCE_REPORT.add_timing('total_ms', time.monotonic() - start_time)
+        raise
+    ttfb = time.monotonic() - start_time
+    HOST_STATS.record_latency(host, ttfb)
+    SOURCE_REPORT.add_timing('ttfb_ms', ttfb)
+    SOURCE_REPORT.update(SOURCE_REPORT.current(), http_status=response.status_code)
+
+    # 5xx 与读取响应体时的网络错误计为主机失败；304、4xx 及内容被拒绝（FetchAborted）说明主机正常响应
+    host_ok = response.status_code < 500
+    try:
+        if response.status_code == 304:
+            return response.status_code, response.headers, None
+        response.raise_for_status()
+        try:
+            body = read_response_body(response)
+        except requests.RequestException:
+            host_ok = False
+            raise
+        SOURCE_REPORT.update(SOURCE_REPORT.current(), bytes=len(body))
+        return response.status_code, response.headers, body
+    finally:
+        HOST_STATS.record_outcome(host, host_ok)
+        response.close()
+        SOURCE_REPORT.add_timing('total_ms', time.monotonic() - start_time)
+
+def get_url_bytes(url, timeout=None):
+    """
+    抓取 URL 的原始响应体（经过抓取缓存、非文本过滤与大小限制）
+    :param url: 原始 URL
+    :param timeout: 超时秒数，默认按主机延迟统计自适应
+    :return: bytes or None
+    """
+    SOURCE_REPORT.set_current(url)
     try:
         # 预处理 URL
         processed_url = preprocess_url(url)
-        
-        response = requests.get(processed_url, timeout=timeout)
-        response.raise_for_status()
+        if timeout is None:
+            timeout = HOST_STATS.get_timeout(urlparse(processed_url).netloc.lower())
 
-        byte_content = response.content
+        # 查找抓取缓存，存在时发送条件请求
+        cache_meta = FETCH_CACHE.lookup(processed_url) if FETCH_CACHE_ENABLED else None
+        headers = FETCH_CACHE.conditional_headers(cache_meta)
 
-        # 检查 HTTP Content-Type，过滤掉明显的非文本
-        content_type = response.headers.get('Content-Type', '').lower()
-        skip_types = ['image/', 'video/', 'audio/', 'application/octet-stream', 'application/pdf', 'application/zip']
-        if any(t in content_type for t in skip_types):
-            print(f"  [Skip] URL Content-Type 为非文本类型: {content_type}")
-            return None
+        with get_host_semaphore(processed_url):
+            status, response_headers, byte_content = download_url(processed_url, timeout, headers or None)
+
+            if status == 304 and cache_meta:
+                cached_content = FETCH_CACHE.load(processed_url, cache_meta)
+                if cached_content is not None:
+                    print(f"Fetched URL (cache, 304): {url}")
+                    return cached_content
+                # 缓存读取失败，重新完整下载
+                status, response_headers, byte_content = download_url(processed_url, timeout)
+
+        if byte_content is None:
+            raise FetchAborted(f"unexpected status {status}")
 
         print(f"Fetched URL: {url}")
 
-        # 解码
-        content = decode_safely(byte_content)
-        return content
+        if FETCH_CACHE_ENABLED:
+            FETCH_CACHE.store(processed_url, byte_content, response_headers, had_entry=cache_meta is not None)
+
+        return byte_content
+    except FetchAborted as e:
+        print(f"  [Skip] {e}: {url}")
+        record_fetch_failure(url, str(e))
+        return None
     except requests.Timeout as e:
         print(f"Request timed out for URL {url}: {e}")
+        record_fetch_failure(url, "timeout")
         return None
     except requests.RequestException as e:
         print(f"Error fetching URL {url}: {e}")
+        record_fetch_failure(url, f"request error: {e}")
+        return None
+    finally:
+        SOURCE_REPORT.set_current(None)
+# =========================================================
+
+def get_url_content(url, timeout=None):
+    byte_content = get_url_bytes(url, timeout)
+    if byte_content is None:
+        return None
+
+    # 解码
+    return decode_safely(byte_content, url)
+
+def fetch_source_bytes(source):
+    """
+    根据来源类型读取原始字节（本地文件或 URL）
+    :param source: 本地路径或 URL
+    :return: bytes or None
+    """
+    try:
+        if source.startswith('/') or source.startswith('.'):
+            return get_local_file_bytes(source)
+        elif source.startswith('http'):
+            return get_url_bytes(source)
+    except Exception as e:
+        print(f"Error fetching source {source}: {e}")
+    return None
+
+def parse_json_text(content):
+    """
+    解析 JSON 文本（支持注释与尾随逗号）
+    :param content: str
+    :return: 解析后的对象，非法 JSON 返回 None
+    """
+    try:
+        return intern_strings(parse_jsonc(content))
+    except (ValueError, RecursionError):
         return None
 
+# ================= [新增] 字符串驻留与内存报告 =================
+def intern_strings(obj):
+    """
+    原地驻留对象中的字符串（字典键、字典值、列表元素），使各来源中相同的字符串共享同一对象
+    :param obj: 解析后的 JSON 对象
+    :return: 驻留后的对象
+    """
+    if not INGEST_INTERN_STRINGS:
+        return obj
+    intern = sys.intern
+    if isinstance(obj, str):
+        return intern(obj) if len(obj) <= INGEST_INTERN_MAX_LENGTH else obj
+    stack = [obj]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            # 重新插入以替换键对象，保持原有顺序
+            items = list(node.items())
+            node.clear()
+            for key, value in items:
+                if type(key) is str:
+                    key = intern(key)
+                if type(value) is str:
+                    if len(value) <= INGEST_INTERN_MAX_LENGTH:
+                        value = intern(value)
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+                node[key] = value
+        elif isinstance(node, list):
+            for i, value in enumerate(node):
+                if type(value) is str:
+                    if len(value) <= INGEST_INTERN_MAX_LENGTH:
+                        node[i] = intern(value)
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+    return obj
+
+def report_peak_rss(stage):
+    """
+    输出当前进程的峰值常驻内存
+    :param stage: 阶段名称
+    """
+    if resource is None:
+        return
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    print(f"[Memory] {stage}：峰值 RSS {peak_mb:.1f} MB")
+# =========================================================
+
+# ================= [新增] 按内容哈希的解析缓存 =================
+class ParseCache:
+    """
+    内容寻址的解析缓存：响应体哈希 -> 解析结果（pickle 序列化）
+    内容未变化的来源可跳过编码检测、注释清洗与 JSON 解析
+    """
+    def __init__(self, path, version):
+        self.path = Path(path)
+        self.version = version
+        self.entries = {}
+        self.used = {}
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.stats = {'hit': 0, 'miss': 0}
+
+    def _load(self):
+        self.loaded = True
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+            if isinstance(data, dict) and data.get('version') == self.version:
+                self.entries = data.get('entries', {})
+            else:
+                print("[ParseCache] 缓存版本不一致，忽略旧缓存")
+        except Exception as e:
+            print(f"[ParseCache] 读取缓存失败: {e}")
+
+    def parse(self, byte_data, url=None):
+        """
+        解析字节流为 JSON 对象，命中缓存时直接反序列化
+        每次返回新的对象，调用方可以安全地修改
+        :param byte_data: bytes
+        :param url: 来源 URL（可选，用于解码）
+        :return: 解析后的对象，非法内容返回 None
+        """
+        digest = hashlib.blake2b(byte_data, digest_size=20).digest()
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            blob = self.entries.get(digest)
+            if blob is not None:
+                self.used[digest] = blob
+                self.stats['hit'] += 1
+
+        if blob is not None:
+            start_time = time.monotonic()
+            # 未命中时已在序列化前驻留，pickle 按对象去重，同一结果内重复的字符串反序列化后仍共享同一对象
+            parsed = pickle.loads(blob)
+            SOURCE_REPORT.add_timing('parse_ms', time.monotonic() - start_time, url)
+            SOURCE_REPORT.update(url, parse_cache='hit')
+            return parsed
+
+        content = decode_safely(byte_data, url)
+        start_time = time.monotonic()
+        parsed = parse_json_text(content) if content is not None else None
+        SOURCE_REPORT.add_timing('parse_ms', time.monotonic() - start_time, url)
+        SOURCE_REPORT.update(url, parse_cache='miss')
+        blob = pickle.dumps(parsed, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.entries[digest] = blob
+            self.used[digest] = blob
+            self.stats['miss'] += 1
+        return parsed
+
+    def save(self):
+        """
+        保存本次运行用到的条目（未再出现的内容会被自然淘汰）
+        """
+        if not self.used:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'version': self.version, 'entries': self.used}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            tmp_path.replace(self.path)
+        except Exception as e:
+            print(f"[ParseCache] 写入缓存失败: {e}")
+
+    def print_summary(self):
+        print(f"[ParseCache] 解析缓存：命中 {self.stats['hit']}，未命中 {self.stats['miss']}，"
+              f"保存 {len(self.used)} 条")
+
+PARSE_CACHE = ParseCache(PARSE_CACHE_FILE, (PARSE_CACHE_VERSION, DECODE_VERSION))
+
+def parse_json_bytes(byte_data, url=None):
+    """
+    将原始字节解析为 JSON 对象（启用时经过解析缓存）
+    :param byte_data: bytes
+    :param url: 来源 URL（可选，用于解码）
+    :return: 解析后的对象，非法内容返回 None
+    """
+    if not byte_data:
+        return None
+    if PARSE_CACHE_ENABLED:
+        return PARSE_CACHE.parse(byte_data, url)
+    content = decode_safely(byte_data, url)
+    if content is None:
+        return None
+    start_time = time.monotonic()
+    parsed = parse_json_text(content)
+    SOURCE_REPORT.add_timing('parse_ms', time.monotonic() - start_time, url)
+    return parsed
+# =========================================================
+
 def append_to_file_unique(file_path, line, existing_lines=None):
     """
     向文件中添加唯一行
@@ -251,58 +1571,274 @@ def is_single_cang(parsed_json):
 
     return False
 
-def extract_urls_deep(obj):
+# ================= [新增] 单遍迭代遍历来源 =================
+def walk_source(obj, collect_urls=False, base_url=None, provenance=None, source_id=None):
     """
-    深度遍历 JSON 对象，提取所有以 http(s):// 开头的字符串
+    使用显式栈单遍遍历来源对象（不受递归深度限制），按需同时完成：
+    1. 提取所有以 http(s):// 开头的字符串（先序，与递归遍历的顺序一致）
+    2. 顶层 sites 下字典中以 "./" 开头的字符串值，按 base_url 使用 urljoin 拼接（本地来源不处理）
+    3. 将字典路径上各列表中带标识的元素登记到来源追溯表
+    :param obj: 来源对象 (dict/list/str)
+    :param collect_urls: 是否提取 URL
+    :param base_url: 相对路径拼接的基准 URL，为 None 时不改写
+    :param provenance: 来源追溯表，为 None 时不登记
+    :param source_id: 来源在追溯表中的编号
+    :return: 提取到的 URL 列表（未开启提取时为空）
     """
     urls = []
-    if isinstance(obj, str):
-        if obj.startswith(('http://', 'https://')):
-            urls.append(obj)
-    elif isinstance(obj, dict):
-        for value in obj.values():
-            urls.extend(extract_urls_deep(value))
-    elif isinstance(obj, list):
-        for item in obj:
-            urls.extend(extract_urls_deep(item))
+    rewrite = base_url is not None and not base_url.startswith((".", "/"))
+    # 栈元素：(对象, 从根开始只经过字典的路径（进入列表后为 None）, 是否位于顶层 sites 下)
+    stack = [(obj, '', False)]
+    while stack:
+        node, path, in_sites = stack.pop()
+        if isinstance(node, str):
+            if collect_urls and node.startswith(('http://', 'https://')):
+                urls.append(node)
+        elif isinstance(node, dict):
+            children = []
+            for key, value in node.items():
+                if isinstance(value, str):
+                    if in_sites and rewrite and value.startswith("./"):
+                        value = node[key] = urljoin(base_url, value)
+                    if collect_urls:
+                        children.append((value, None, False))
+                    continue
+                if path is None:
+                    child_path = None
+                else:
+                    child_path = f"{path}.{key}" if path else str(key)
+                children.append((value, child_path, in_sites or (node is obj and key == 'sites')))
+            stack.extend(reversed(children))
+        elif isinstance(node, list):
+            if provenance is not None and path:
+                provenance.tag_items(path, node, source_id)
+            stack.extend((item, None, in_sites) for item in reversed(node)
+                         if collect_urls or not isinstance(item, str))
     return urls
 
-def fetch_and_parse_single_cang(url):
+def extract_urls_deep(obj):
     """
-    尝试获取一个 URL 并将其解析为单仓数据
+    深度遍历 JSON 对象，提取所有以 http(s):// 开头的字符串
+    """
+    return walk_source(obj, collect_urls=True)
+# =========================================================
+
+def fetch_and_parse_json(url):
+    """
+    尝试获取一个 URL 并将其解析为 JSON
+    :param url: 本地路径或 URL
+    :return: 解析后的对象 (dict/list)，失败返回 None
     """
     print(f"  [Multi->Single] Fetching sub-url: {url}")
-    content = None
+    return parse_json_bytes(fetch_source_bytes(url), url)
 
-    if url.startswith('/') or url.startswith('.'):
-        content = get_local_file_content(url)
-    elif url.startswith('http'):
-        content = get_url_content(url)
-    else:
-        return None
+# ================= [新增] 多仓并发爬取 =================
+def crawl_multi_repos(multi_repos, input_urls, max_depth=None):
+    """
+    从多仓出发，维护待抓取 URL 队列并逐层并发抓取，展开嵌套的多仓
+    同一次运行中每个 URL 最多抓取一次
+    :param multi_repos: 顶层多仓列表 [(order_key, url, data)]
+    :param input_urls: 输入文件中的 URL 集合（已处理，跳过）
+    :param max_depth: 多仓最大展开深度，顶层多仓为第 1 层，默认 MULTI_REPO_MAX_DEPTH
+    :return: (resolved, nested_multi_urls, failed_urls)
+        resolved: 解析为单仓的 [(order_key, url, dict)]
+        nested_multi_urls: 嵌套多仓 URL 列表
+        failed_urls: 抓取或解析失败的 URL 列表
+    """
+    if max_depth is None:
+        max_depth = MULTI_REPO_MAX_DEPTH
+
+    seen = set()
+    resolved = []
+    nested_multi_urls = []
+    failed_urls = []
+
+    def expand(order_key, url, data, urls=None):
+        """提取多仓中的子 URL，过滤后加入下一层队列"""
+        if urls is None:
+            urls = extract_urls_deep(data)
+        extracted_sub_urls = list(dict.fromkeys(urls))
+        print(f"  [Crawl] {url}: found {len(extracted_sub_urls)} potential URLs.")
+
+        queued = []
+        for sub_url in extracted_sub_urls:
+            # 检查是否在输入文件的 URL 中存在
+            if sub_url in input_urls:
+                print(f"  [Filter] Skipping URL (exists in input): {sub_url}")
+                continue
+            # 检查本次运行是否已经抓取过（多个多仓指向同一地址）
+            if sub_url in seen:
+                print(f"  [Filter] Skipping URL (already crawled): {sub_url}")
+                continue
+            # 检查是否处于失效退避期
+            if NEGATIVE_CACHE.should_skip(sub_url):
+                print(f"  [Filter] Skipping URL (backoff until {NEGATIVE_CACHE.next_retry_text(sub_url)}): {sub_url}")
+                SOURCE_REPORT.update(sub_url, status='backoff')
+                seen.add(sub_url)
+                continue
+            seen.add(sub_url)
+            queued.append((order_key + (len(queued),), sub_url))
+
+        print(f"  After filtering: {len(queued)} URLs to process")
+        return queued
+
+    def mark_success(sub_url):
+        """子 URL 被识别为单仓或多仓后，清除其失效记录"""
+        NEGATIVE_CACHE.record_success(sub_url)
+        SOURCE_REPORT.update(sub_url, status='ok')
+
+    frontier = []
+    for order_key, url, data in multi_repos:
+        seen.add(url)
+        frontier.extend(expand(order_key, url, data))
+
+    depth = 1
+    while frontier:
+        print(f"[Crawl] Depth {depth}: fetching {len(frontier)} URLs...")
+        results = fetch_concurrently([sub_url for _, sub_url in frontier], fetch_and_parse_json)
+
+        next_frontier = []
+        for (order_key, sub_url), sub_data in zip(frontier, results):
+            sub_urls = extract_urls_deep(sub_data) if isinstance(sub_data, (dict, list)) else []
+
+            # 只有被识别为单仓或多仓时才视为成功，其余（如不含 URL 的列表）按失败处理并继续退避
+            if is_single_cang(sub_data):
+                print(f"  [OK] Resolved as single仓: {sub_url}")
+                mark_success(sub_url)
+                resolved.append((order_key, sub_url, sub_data))
+            elif sub_urls:
+                mark_success(sub_url)
+                nested_multi_urls.append(sub_url)
+                if depth < max_depth:
+                    print(f"  [Multi] Nested multi仓 at depth {depth + 1}: {sub_url}")
+                    next_frontier.extend(expand(order_key, sub_url, sub_data, sub_urls))
+                else:
+                    print(f"  [Multi] Reached max depth {max_depth}, not expanding: {sub_url}")
+            elif isinstance(sub_data, dict):
+                # 不含子 URL 的字典，沿用原逻辑按单仓处理
+                print(f"  [OK] Resolved as single仓: {sub_url}")
+                mark_success(sub_url)
+                resolved.append((order_key, sub_url, sub_data))
+            else:
+                print(f"  [SKIP] Not valid JSON or not dict: {sub_url}")
+                failed_urls.append(sub_url)
+                NEGATIVE_CACHE.record_failure(sub_url, get_invalid_reason(sub_url))
+                SOURCE_REPORT.update(sub_url, status=get_invalid_reason(sub_url))
 
-    if content is None:
-        return None
+        frontier = next_frontier
+        depth += 1
 
-    # 清洗
-    content = remove_comments_from_string(content)
-    content = content.replace("\n", "").replace("\r", "")
+    return resolved, nested_multi_urls, failed_urls
+# =========================================================
 
-    if not is_json(content):
-        return None
+# ================= [新增] 失效源负缓存 =================
+class NegativeCache:
+    """
+    失效源负缓存：URL -> {失败原因, 首次/最近失败时间, 连续失败次数, 下次重试时间}
+    处于退避期内的 URL 不再抓取，退避期满后自动重试，成功即移除记录
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = None
+        self.lock = threading.Lock()
+        self.stats = {'skipped': 0, 'failed': 0, 'recovered': 0}
+
+    def _ensure_loaded(self):
+        if self.entries is not None:
+            return
+        self.entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def exists(self):
+        return self.path.exists()
+
+    def seed_from_history(self, urls, failed_at):
+        """
+        从旧的无效历史文件迁移：视为已连续失败 NEGATIVE_CACHE_MAX_ATTEMPTS 次
+        """
+        with self.lock:
+            self._ensure_loaded()
+            for url in urls:
+                if url not in self.entries:
+                    self._update(url, 'invalid history', failed_at, NEGATIVE_CACHE_MAX_ATTEMPTS)
+        print(f"[NegativeCache] 从无效历史迁移 {len(urls)} 条记录")
+
+    def _update(self, url, reason, failed_at, attempts):
+        entry = self.entries.get(url, {})
+        delay_hours = min(NEGATIVE_CACHE_BASE_HOURS * 2 ** (attempts - 1), NEGATIVE_CACHE_MAX_HOURS)
+        self.entries[url] = {
+            'reason': reason,
+            'first_failed': entry.get('first_failed', failed_at),
+            'last_failed': failed_at,
+            'attempts': attempts,
+            'next_retry': failed_at + delay_hours * 3600
+        }
+
+    def should_skip(self, url):
+        """
+        判断 URL 是否仍处于退避期
+        """
+        with self.lock:
+            self._ensure_loaded()
+            entry = self.entries.get(url)
+            if entry and time.time() < entry.get('next_retry', 0):
+                self.stats['skipped'] += 1
+                return True
+        return False
 
-    try:
-        parsed = json.loads(content)
-        if isinstance(parsed, dict):
-            return parsed
-        else:
-            return None
-    except:
-        return None
+    def next_retry_text(self, url):
+        entry = self.entries.get(url) or {}
+        return datetime.datetime.fromtimestamp(entry.get('next_retry', 0)).strftime('%Y-%m-%d %H:%M')
+
+    def record_failure(self, url, reason):
+        with self.lock:
+            self._ensure_loaded()
+            attempts = self.entries.get(url, {}).get('attempts', 0) + 1
+            self._update(url, reason, time.time(), attempts)
+            self.stats['failed'] += 1
+
+    def record_success(self, url):
+        with self.lock:
+            self._ensure_loaded()
+            if self.entries.pop(url, None) is not None:
+                self.stats['recovered'] += 1
+                print(f"[NegativeCache] 已恢复: {url}")
+
+    def is_exhausted(self, url):
+        """
+        连续失败次数是否已达到 NEGATIVE_CACHE_MAX_ATTEMPTS
+        """
+        with self.lock:
+            self._ensure_loaded()
+            return self.entries.get(url, {}).get('attempts', 0) >= NEGATIVE_CACHE_MAX_ATTEMPTS
+
+    def save(self):
+        if self.entries is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=1)
+            tmp_path.replace(self.path)
+        except OSError as e:
+            print(f"[NegativeCache] 保存失败: {e}")
+
+    def print_summary(self):
+        print(f"[NegativeCache] 退避跳过 {self.stats['skipped']}，新增失败 {self.stats['failed']}，"
+              f"恢复 {self.stats['recovered']}，当前记录 {len(self.entries or {})} 条")
+
+NEGATIVE_CACHE = NegativeCache(NEGATIVE_CACHE_FILE)
+# =========================================================
 
 def process_input_file(input_file_path=INPUT_FILE_PATH):
     """
     处理输入文件
+    处于退避期或失败次数未达上限的源会保留在 valid_sources 中（写回输入文件），以便之后自动重试
     """
     raw_data_map = {} # 存储原始数据: url -> data
     valid_sources = []
@@ -310,39 +1846,49 @@ def process_input_file(input_file_path=INPUT_FILE_PATH):
 
     try:
         with open(input_file_path, 'r', encoding='utf-8') as input_file:
-            for line in input_file:
-                trimmed_line = line.strip()
-                if not trimmed_line:
-                    continue
+            lines = [line.strip() for line in input_file]
+        lines = [line for line in lines if line]
+
+        # 并发抓取所有可处理的来源（重复行只抓取一次，跳过处于退避期的源）
+        supported = [line for line in dict.fromkeys(lines)
+                     if line.startswith(('/', '.', 'http'))]
+        deferred = {line for line in supported if NEGATIVE_CACHE.should_skip(line)}
+        fetchable = [line for line in supported if line not in deferred]
+        print(f"Fetching {len(fetchable)} sources with {FETCH_MAX_WORKERS} workers...")
+        body_map = dict(zip(fetchable, fetch_concurrently(fetchable, fetch_source_bytes)))
+
+        # 按输入顺序解析，保证合并结果确定
+        for trimmed_line in lines:
+            print(f"Processing line: {trimmed_line}")
+
+            if trimmed_line in deferred:
+                print(f"[Backoff] Skipping until {NEGATIVE_CACHE.next_retry_text(trimmed_line)}, keep in input.")
+                SOURCE_REPORT.update(trimmed_line, status='backoff')
+                valid_sources.append(trimmed_line)
+                continue
 
-                print(f"Processing line: {trimmed_line}")
-                content = None
+            if trimmed_line not in body_map:
+                print("Line does not start with '/' or 'http', skipping.")
+                SOURCE_REPORT.update(trimmed_line, status='unsupported source')
+                invalid_sources.append(trimmed_line)
+                continue
 
-                if trimmed_line.startswith('/') or trimmed_line.startswith('.'):
-                    content = get_local_file_content(trimmed_line)
-                elif trimmed_line.startswith('http'):
-                    content = get_url_content(trimmed_line)
-                else:
-                    print("Line does not start with '/' or 'http', skipping.")
-                    invalid_sources.append(trimmed_line)
-                    continue
+            parsed_dict = parse_json_bytes(body_map[trimmed_line], trimmed_line)
 
-                if content is not None:
-                    content = remove_comments_from_string(content)
-                    content = content.replace("\n", "").replace("\r", "")
-
-                if content is not None and is_json(content):
-                    try:
-                        parsed_dict = json.loads(content)
-                        raw_data_map[trimmed_line] = parsed_dict
-                        valid_sources.append(trimmed_line)
-                        print("Parsed JSON successfully.")
-                    except Exception as e:
-                        print(f"JSON 解析失败: {e}")
-                        invalid_sources.append(trimmed_line)
-                else:
-                    print("Content is not valid JSON, skipping.")
-                    invalid_sources.append(trimmed_line)
+            if parsed_dict is not None:
+                raw_data_map[trimmed_line] = parsed_dict
+                valid_sources.append(trimmed_line)
+                NEGATIVE_CACHE.record_success(trimmed_line)
+                SOURCE_REPORT.update(trimmed_line, status='ok')
+                print("Parsed JSON successfully.")
+            else:
+                print("Content is not valid JSON, skipping.")
+                invalid_sources.append(trimmed_line)
+                NEGATIVE_CACHE.record_failure(trimmed_line, get_invalid_reason(trimmed_line))
+                SOURCE_REPORT.update(trimmed_line, status=get_invalid_reason(trimmed_line))
+                # 失败次数未达上限的源保留在输入文件中，退避期满后重试
+                if not NEGATIVE_CACHE.is_exhausted(trimmed_line):
+                    valid_sources.append(trimmed_line)
 
         return raw_data_map, valid_sources, invalid_sources
     except FileNotFoundError:
@@ -378,8 +1924,30 @@ def custom_list_merge(merger, path, list1, list2):
         merged_list = list(key_id_dict.values())
         return merged_list
     else:
-        unique_items = set(list1).union(set(list2))
-        return list(unique_items)
+        return dedupe_list_items(list1 + list2)
+
+def dedupe_list_items(items):
+    """
+    按首次出现的顺序去重，结果在多次运行间保持稳定
+    不可哈希的元素（字典、嵌套列表）按规范化 JSON 序列化后参与去重
+    :param items: 列表
+    :return: 去重后的新列表
+    """
+    seen = set()
+    unique_items = []
+    for item in items:
+        try:
+            hash(item)
+            marker = item
+        except TypeError:
+            # JSON 解析结果中不会出现元组，用元组标记序列化键以免与字符串元素冲突
+            marker = ('json', json.dumps(item, ensure_ascii=False, sort_keys=True,
+                                         separators=(',', ':'), default=repr))
+        if marker in seen:
+            continue
+        seen.add(marker)
+        unique_items.append(item)
+    return unique_items
 
 custom_merger = Merger(
     [
@@ -392,76 +1960,373 @@ custom_merger = Merger(
     ["override"]
 )
 
-def merge_dicts(dicts_list):
+def merge_dicts_pairwise(dicts_list):
+    """
+    逐个来源通过 deepmerge 折叠合并（原实现，用于 --benchmark-merge 对比）
+    """
     merged_dict = {}
     for d in dicts_list:
         merged_dict = custom_merger.merge(merged_dict, d)
     return merged_dict
 
-def validate_lives_element(element):
+def merge_dicts(dicts_list):
+    """
+    在当前进程中按来源顺序单遍合并
+    不按顶层字段分片放入进程池：分片在进程间来回序列化的开销远大于合并本身
+    :param dicts_list: 待合并的字典列表（按合并顺序）
+    :return: 合并后的字典
+    """
+    engine = MergeEngine()
+    for d in dicts_list:
+        engine.merge(d)
+    return engine.result()
+
+# ================= [新增] 单遍多路合并引擎 =================
+LIST_IDENTIFIER_FIELDS = ('key', 'id', 'name')
+
+def get_list_item_identifier(item):
+    """
+    列表元素的标识：key/id/name 中第一个非空值，与 custom_list_merge 一致
+    """
+    return next((item.get(field) for field in LIST_IDENTIFIER_FIELDS if item.get(field)), None)
+
+class ListIndex:
+    """
+    合并过程中某个列表路径的 标识 -> 元素 索引，按插入顺序即为合并后的列表顺序
+    合并期间代替列表存放在合并结果中，result() 时再还原为列表
+    """
+    def __init__(self, items):
+        self.entries = {}
+        self.dirty = False
+        self.rebuild(items)
+
+    def rebuild(self, items):
+        """
+        按 custom_list_merge 处理 list1 的方式重建索引
+        """
+        entries = {}
+        for item in items:
+            identifier = get_list_item_identifier(item)
+            # 无标识的元素使用唯一对象作为键，可随检查点一起序列化
+            entries[identifier if identifier is not None else object()] = item
+        self.entries = entries
+        self.dirty = False
+
+    def apply(self, items):
+        """
+        按 custom_list_merge 处理 list2 的方式应用一个来源的列表
+        """
+        if self.dirty:
+            # 合并后元素标识发生变化时，逐次折叠会按新标识重建，这里保持一致
+            self.rebuild(list(self.entries.values()))
+        entries = self.entries
+        for item in items:
+            identifier = get_list_item_identifier(item)
+            if identifier is None:
+                entries[object()] = item
+            elif identifier in entries:
+                target = entries[identifier]
+                target.update(item)
+                if get_list_item_identifier(target) != identifier:
+                    self.dirty = True
+            else:
+                entries[identifier] = item
+
+    def to_list(self):
+        return list(self.entries.values())
+
+class MergeEngine:
+    """
+    单遍多路合并：语义与 custom_merger 逐个来源折叠完全一致
+    每个列表路径在整个合并过程中只维护一个 标识 -> 元素 索引，
+    每个来源的元素只对索引应用一次，不再每一步从累积列表重建 key_id_dict
+    """
+    def __init__(self):
+        self.root = {}
+
+    def merge(self, d):
+        self.root = self._merge_value(self.root, d)
+
+    def _merge_value(self, base, nxt):
+        if isinstance(base, ListIndex):
+            if isinstance(nxt, list):
+                return self._merge_list(base, nxt)
+            return nxt
+        if isinstance(base, list) and isinstance(nxt, list):
+            return self._merge_list(base, nxt)
+        if isinstance(base, set) and isinstance(nxt, set):
+            return base | nxt
+        if isinstance(base, tuple) and isinstance(nxt, tuple):
+            return base + nxt
+        if isinstance(base, dict) and isinstance(nxt, dict):
+            for k, v in nxt.items():
+                if k not in base:
+                    base[k] = v
+                else:
+                    base[k] = self._merge_value(base[k], v)
+            return base
+        return nxt
+
+    def _merge_list(self, base, nxt):
+        if not all(isinstance(item, dict) for item in nxt):
+            # 含非字典元素时按 custom_list_merge 原逻辑（集合并集）处理
+            if isinstance(base, ListIndex):
+                base = base.to_list()
+            return custom_list_merge(custom_merger, None, base, nxt)
+        if isinstance(base, list):
+            # 第一个列表按引用放入结果，第二个列表到来时才建立索引
+            if not all(isinstance(item, dict) for item in base):
+                return custom_list_merge(custom_merger, None, base, nxt)
+            base = ListIndex(base)
+        base.apply(nxt)
+        return base
+
+    def result(self):
+        """
+        将结果中的索引还原为列表并返回合并结果（合并引擎随后不可再继续使用）
+        """
+        return self._materialize(self.root)
+
+    def _materialize(self, obj):
+        if isinstance(obj, ListIndex):
+            return obj.to_list()
+        if isinstance(obj, dict):
+            for k, v in obj.items():
+                if isinstance(v, (dict, ListIndex)):
+                    obj[k] = self._materialize(v)
+        return obj
+# =========================================================
+
+# ================= [新增] 增量合并 =================
+def fingerprint_contribution(d):
+    """
+    计算单个来源（预处理后）内容的指纹
+    :param d: 单仓字典
+    :return: bytes 摘要
+    """
+    data = json.dumps(d, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=20).digest()
+
+def merge_dicts_incremental(dicts_list, state_dir=INCREMENTAL_MERGE_DIR,
+                            checkpoint_interval=INCREMENTAL_CHECKPOINT_INTERVAL):
+    """
+    增量合并：按来源顺序计算前缀链式指纹，并以指纹为文件名保存合并引擎的检查点
+    下次运行时从最长的未变化前缀的检查点继续合并，只重新合并新增、删除或变化来源之后的部分
+    由于合并是按顺序进行的，结果与 merge_dicts() 完全重建一致
+    计算指纹与读写检查点的开销通常高于完整合并，因此仅在 --incremental 时使用
+    :param dicts_list: 待合并的字典列表（按合并顺序）
+    :param state_dir: 检查点目录
+    :param checkpoint_interval: 检查点间隔
+    :return: 合并后的字典
+    """
+    state_dir = Path(state_dir)
+
+    # chain[k] 表示前 k 个来源合并后的状态指纹
+    digest = hashlib.blake2b(f"merge-v{INCREMENTAL_MERGE_VERSION}".encode('utf-8'), digest_size=20).digest()
+    chain = [digest.hex()]
+    for d in dicts_list:
+        digest = hashlib.blake2b(digest + fingerprint_contribution(d), digest_size=20).digest()
+        chain.append(digest.hex())
+
+    # 查找可复用的最长前缀检查点
+    engine = MergeEngine()
+    resume_from = 0
+    for k in range(len(dicts_list), 0, -1):
+        checkpoint_path = state_dir / f"{chain[k]}.pickle"
+        if not checkpoint_path.exists():
+            continue
+        try:
+            with open(checkpoint_path, 'rb') as f:
+                engine = pickle.load(f)
+            resume_from = k
+            break
+        except Exception as e:
+            print(f"[Merge] 读取检查点失败 {checkpoint_path.name}: {e}")
+
+    print(f"[Merge] 增量合并：复用前 {resume_from}/{len(dicts_list)} 个来源的合并结果，"
+          f"重新合并 {len(dicts_list) - resume_from} 个来源")
+
+    keep_files = {f"{chain[k]}.pickle" for k in range(1, resume_from + 1)
+                  if k % checkpoint_interval == 0 or k == resume_from}
+    for k in range(resume_from + 1, len(dicts_list) + 1):
+        engine.merge(dicts_list[k - 1])
+        if k % checkpoint_interval == 0 or k == len(dicts_list):
+            checkpoint_name = f"{chain[k]}.pickle"
+            try:
+                state_dir.mkdir(parents=True, exist_ok=True)
+                # 立即序列化快照（包含列表索引），后续合并会原地修改合并结果
+                tmp_path = state_dir / f"{checkpoint_name}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(engine, f, protocol=pickle.HIGHEST_PROTOCOL)
+                tmp_path.replace(state_dir / checkpoint_name)
+                keep_files.add(checkpoint_name)
+            except Exception as e:
+                print(f"[Merge] 保存检查点失败 {checkpoint_name}: {e}")
+
+    # 清理不属于当前来源序列的旧检查点
+    if state_dir.exists():
+        for path in state_dir.glob('*.pickle'):
+            if path.name not in keep_files:
+                path.unlink(missing_ok=True)
+
+    return engine.result()
+# =========================================================
+
+def run_merge_benchmark(dicts_list, rounds=3):
+    """
+    对比合并引擎与 deepmerge 逐个折叠的耗时，并校验两者结果一致
+    两种合并都会原地修改输入，每轮使用深拷贝
+    :param dicts_list: 待合并的字典列表
+    :param rounds: 每种实现的运行轮数，取最快一轮
+    """
+    results = {}
+    for name, merge_func in (('deepmerge', merge_dicts_pairwise), ('engine', merge_dicts)):
+        best = None
+        for _ in range(rounds):
+            inputs = copy.deepcopy(dicts_list)
+            start_time = time.perf_counter()
+            merged = merge_func(inputs)
+            elapsed = time.perf_counter() - start_time
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = (best, json.dumps(merged, ensure_ascii=False))
+        print(f"[Benchmark] {name}: {best * 1000:.1f} ms (best of {rounds})")
+
+    speedup = results['deepmerge'][0] / results['engine'][0] if results['engine'][0] else float('inf')
+    identical = results['deepmerge'][1] == results['engine'][1]
+    print(f"[Benchmark] {len(dicts_list)} 个来源，加速 {speedup:.1f}x，结果{'一致' if identical else '不一致'}")
+
+# 含有该标记的 lives 元素视为无效
+LIVES_PROXY_MARKER = 'proxy://'
+
+def contains_proxy_marker(obj):
+    """
+    遍历对象中的字符串（字典键、字典值、列表元素），检查是否包含 proxy://
+    与在 json.dumps 的结果中查找等价，但不构造中间字符串
+    :param obj: 待检查的对象
+    :return: 是否包含
+    """
+    if isinstance(obj, str):
+        return LIVES_PROXY_MARKER in obj
+    stack = [obj]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if isinstance(key, str) and LIVES_PROXY_MARKER in key:
+                    return True
+                if isinstance(value, str):
+                    if LIVES_PROXY_MARKER in value:
+                        return True
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+        elif isinstance(node, list):
+            for value in node:
+                if isinstance(value, str):
+                    if LIVES_PROXY_MARKER in value:
+                        return True
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+    return False
+
+def validate_lives_element(element, rejections=None):
     """
     验证单个 lives 元素是否符合内置频道模式的合法结构
     确保不会导致 loadLives 方法异常中断
+    proxy:// 检查与频道 URL 检查在同一次遍历中完成，元素被拒绝时不修改原结构
     :param element: lives 数组中的单个元素
+    :param rejections: 可选的 Counter，按原因累计被拒绝的元素数
     :return: bool - 是否合法
     """
+    reason = None
     # 检查元素是否为字典
     if not isinstance(element, dict):
-        print("  [Validate] 跳过：非字典元素")
-        return False
-    
+        reason = "非字典元素"
     # 检查是否包含必要字段
-    if 'group' not in element:
-        print("  [Validate] 跳过：缺少 group 字段")
-        return False
-    
-    if 'channels' not in element:
-        print("  [Validate] 跳过：缺少 channels 字段")
-        return False
-    
+    elif 'group' not in element:
+        reason = "缺少 group 字段"
+    elif 'channels' not in element:
+        reason = "缺少 channels 字段"
     # 检查 group 字段是否为非空字符串
-    if not isinstance(element['group'], str) or not element['group'].strip():
-        print("  [Validate] 跳过：group 字段为空或非字符串")
-        return False
-    
+    elif not isinstance(element['group'], str) or not element['group'].strip():
+        reason = "group 字段为空或非字符串"
     # 检查 channels 字段是否为数组
-    if not isinstance(element['channels'], list):
-        print("  [Validate] 跳过：channels 字段非数组")
-        return False
-    
+    elif not isinstance(element['channels'], list):
+        reason = "channels 字段非数组"
     # 检查 channels 数组是否为空
-    if not element['channels']:
-        print("  [Validate] 跳过：channels 数组为空")
-        return False
+    elif not element['channels']:
+        reason = "channels 数组为空"
+    else:
+        reason = _check_lives_channels(element)
     
-    # 检查是否包含 proxy://，如果包含则视为无效
-    element_str = json.dumps(element)
-    if 'proxy://' in element_str:
-        print("  [Validate] 跳过：包含 proxy://")
-        return False
+    if reason is None:
+        return True
+    if rejections is not None:
+        rejections[reason] += 1
+    return False
+
+def _check_lives_channels(element):
+    """
+    一次遍历完成 proxy:// 检查和频道检查，全部通过后才写回过滤后的 channels 与 urls
+    :param element: 已通过基本字段检查的 lives 元素
+    :return: 拒绝原因，合法时为 None
+    """
+    proxy_reason = "包含 proxy://"
+    # 检查除 channels 以外的字段是否包含 proxy://
+    for key, value in element.items():
+        if isinstance(key, str) and LIVES_PROXY_MARKER in key:
+            return proxy_reason
+        if key != 'channels' and contains_proxy_marker(value):
+            return proxy_reason
     
-    # 检查每个 channel 元素
+    # 检查每个 channel 元素；需要过滤 URL 的频道暂存到最后统一写回，全部合法时沿用原列表
     valid_channels = []
+    channels_to_filter = []
     for channel in element['channels']:
-        if isinstance(channel, dict) and 'name' in channel and 'urls' in channel:
-            if isinstance(channel['name'], str) and channel['name'].strip():
-                if isinstance(channel['urls'], list) and channel['urls']:
-                    # 检查 urls 数组元素是否为字符串
-                    valid_urls = []
-                    for url in channel['urls']:
-                        if isinstance(url, str) and url.strip():
-                            valid_urls.append(url)
-                    if valid_urls:
-                        channel['urls'] = valid_urls
-                        valid_channels.append(channel)
+        if not (isinstance(channel, dict) and 'name' in channel and 'urls' in channel):
+            if contains_proxy_marker(channel):
+                return proxy_reason
+            continue
+        for key, value in channel.items():
+            if isinstance(key, str) and LIVES_PROXY_MARKER in key:
+                return proxy_reason
+            if key == 'urls':
+                continue
+            if isinstance(value, str):
+                if LIVES_PROXY_MARKER in value:
+                    return proxy_reason
+            elif contains_proxy_marker(value):
+                return proxy_reason
+        
+        urls = channel['urls']
+        if not isinstance(urls, list):
+            if contains_proxy_marker(urls):
+                return proxy_reason
+            continue
+        # 检查 urls 数组元素是否为字符串
+        valid_url_count = 0
+        for url in urls:
+            if isinstance(url, str):
+                if LIVES_PROXY_MARKER in url:
+                    return proxy_reason
+                if url.strip():
+                    valid_url_count += 1
+            elif contains_proxy_marker(url):
+                return proxy_reason
+        name = channel['name']
+        if valid_url_count and isinstance(name, str) and name.strip():
+            valid_channels.append(channel)
+            if valid_url_count != len(urls):
+                channels_to_filter.append(channel)
     
     if not valid_channels:
-        print("  [Validate] 跳过：channels 数组中无合法频道")
-        return False
+        return "channels 数组中无合法频道"
     
     # 更新为验证后的 channels
-    element['channels'] = valid_channels
-    return True
+    for channel in channels_to_filter:
+        channel['urls'] = [url for url in channel['urls'] if isinstance(url, str) and url.strip()]
+    if len(valid_channels) != len(element['channels']):
+        element['channels'] = valid_channels
+    return None
 
 
 def parse_m3u_content(content):
@@ -485,14 +2350,15 @@ def parse_m3u_content(content):
                 # 提取分组和频道名
                 group_match = re.search(r'group-title="([^"]*)"', line)
                 if group_match:
-                    current_group = group_match.group(1)
+                    current_group = sys.intern(group_match.group(1))
                 
                 # 提取频道名
                 name_match = re.search(r',(.+)$', line)
                 if name_match:
-                    current_channel = name_match.group(1).strip()
+                    current_channel = sys.intern(name_match.group(1).strip())
                 
             elif line.startswith('http') and current_channel:
+                line = sys.intern(line)
                 # 添加URL到对应频道
                 if current_group not in groups:
                     groups[current_group] = {}
@@ -546,6 +2412,7 @@ def parse_txt_content(content):
                 # 去除可能存在的末尾逗号
                 if current_group.endswith(','):
                     current_group = current_group[:-1].strip()
+                current_group = sys.intern(current_group)
                 if current_group not in groups:
                     groups[current_group] = {}
             else:
@@ -553,13 +2420,13 @@ def parse_txt_content(content):
                 # 只在第一个逗号处分割，处理URL中可能包含逗号的情况
                 comma_index = line.find(',')
                 if comma_index != -1:
-                    channel_name = line[:comma_index].strip()
+                    channel_name = sys.intern(line[:comma_index].strip())
                     channel_urls_str = line[comma_index+1:].strip()
                     
                     if channel_name and channel_urls_str:
                         # 按 # 分割多个 URL
                         for url in channel_urls_str.split('#'):
-                            url = url.strip()
+                            url = sys.intern(url.strip())
                             if url and (url.startswith('http') or url.startswith('rtsp') or url.startswith('rtmp')):
                                 if current_group not in groups:
                                     groups[current_group] = {}
@@ -593,43 +2460,60 @@ def parse_txt_content(content):
 
 
 
-def convert_to_group_format(element):
+def get_playlist_type(element):
     """
-    将非合法的lives元素转换为合法的group格式
+    判断 lives 元素是否为需要下载展开的 m3u/txt 播放列表
     :param element: lives数组中的单个元素
-    :return: 转换后的group格式元素，转换失败返回None
+    :return: (URL, 'm3u' 或 'txt')，不是播放列表时返回 (URL 或 None, None)
     """
     if not isinstance(element, dict) or 'url' not in element:
-        return None
+        return None, None
     
     url = element.get('url', '').strip()
     if not url:
-        return None
+        return None, None
     
     # 检测URL类型
     url_lower = url.lower()
-    
     if url_lower.endswith('.m3u'):
+        return url, 'm3u'
+    if url_lower.endswith('.txt'):
+        return url, 'txt'
+    return url, None
+
+def parse_playlist_content(playlist_type, content):
+    """
+    按播放列表类型解析下载到的内容
+    :param playlist_type: 'm3u' 或 'txt'
+    :param content: 播放列表内容
+    :return: 转换后的group格式列表，内容为空时返回None
+    """
+    if not content:
+        return None
+    if playlist_type == 'm3u':
         # 处理m3u类型
-        content = get_url_content(url)
-        if content:
-            return parse_m3u_content(content)
+        return parse_m3u_content(content)
+    # 处理txt类型，根据内容特征判断是m3u还是txt格式
+    if content.strip().startswith('#EXTM3U'):
+        print("[Convert] 检测到txt后缀的m3u格式内容")
+        return parse_m3u_content(content)
+    print("[Convert] 检测到txt格式内容")
+    return parse_txt_content(content)
+
+def convert_to_group_format(element):
+    """
+    将非合法的lives元素转换为合法的group格式
+    :param element: lives数组中的单个元素
+    :return: 转换后的group格式元素，转换失败返回None
+    """
+    url, playlist_type = get_playlist_type(element)
+    if not url:
         return None
     
-    elif url_lower.endswith('.txt'):
-        # 处理txt类型，根据内容判断实际格式
-        content = get_url_content(url)
-        if content:
-            # 根据内容特征判断是m3u还是txt格式
-            if content.strip().startswith('#EXTM3U'):
-                print("[Convert] 检测到txt后缀的m3u格式内容")
-                return parse_m3u_content(content)
-            else:
-                print("[Convert] 检测到txt格式内容")
-                return parse_txt_content(content)
-        return None
+    if playlist_type:
+        return parse_playlist_content(playlist_type, get_url_content(url))
     
-    elif url_lower.endswith('.m3u8'):
+    if url.lower().endswith('.m3u8'):
         # 处理m3u8类型
         try:
             group_name = element.get('group', '其他').strip() or '其他'
@@ -651,6 +2535,46 @@ def convert_to_group_format(element):
     
     return None
 
+# ================= [新增] lives 播放列表批量展开 =================
+def expand_playlists(playlists):
+    """
+    批量展开播放列表：并发下载（共享抓取线程池与按主机并发限制），内容较大时在进程池中解析
+    相同 URL 只下载和解析一次，重复出现时使用解析结果的副本
+    :param playlists: [(URL, 'm3u' 或 'txt')]
+    :return: 与 playlists 一一对应的group格式列表（失败为None）
+    """
+    unique = list(dict.fromkeys(playlists))
+    if not unique:
+        return []
+    print(f"[Convert] 并发下载 {len(unique)} 个 lives 播放列表")
+    contents = fetch_concurrently([url for url, _ in unique], get_url_content)
+    
+    types = [playlist_type for _, playlist_type in unique]
+    workers = min(LIVES_PLAYLIST_PARSE_MAX_WORKERS, sum(1 for content in contents if content))
+    total_chars = sum(len(content) for content in contents if content)
+    parsed = None
+    if workers > 1 and total_chars >= LIVES_PLAYLIST_PROCESS_MIN_CHARS:
+        print(f"[Convert] 在 {workers} 个进程中解析播放列表（共 {total_chars} 字符）")
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # 结果经序列化返回，重新驻留以恢复进程内的字符串共享
+                parsed = [intern_strings(result) for result in executor.map(parse_playlist_content, types, contents)]
+        except (OSError, BrokenProcessPool) as e:
+            print(f"[Convert] 进程池不可用，改为在当前进程解析: {e}")
+            parsed = None
+    if parsed is None:
+        parsed = [parse_playlist_content(playlist_type, content) for playlist_type, content in zip(types, contents)]
+    
+    results = dict(zip(unique, parsed))
+    expanded = []
+    used = set()
+    for playlist in playlists:
+        result = results[playlist]
+        expanded.append(copy.deepcopy(result) if playlist in used else result)
+        used.add(playlist)
+    return expanded
+# =========================================================
+
 def get_most_frequent(stats_dict):
     """
     获取出现次数最多的键，当次数一样多时选择长度最短的键，当长度也一样时按照名称排序
@@ -704,9 +2628,8 @@ def write_m3u_to_file(m3u_content, file_path):
     :param file_path: 文件路径
     """
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(m3u_content)
-        print(f"M3U content written to: {file_path}")
+        if write_text_if_changed(file_path, m3u_content):
+            print(f"M3U content written to: {file_path}")
     except Exception as e:
         print(f"Error writing M3U file {file_path}: {str(e)}")
 
@@ -761,26 +2684,64 @@ def write_txt_to_file(txt_content, file_path):
     :param file_path: 文件路径
     """
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(txt_content)
-        print(f"TXT content written to: {file_path}")
+        if write_text_if_changed(file_path, txt_content):
+            print(f"TXT content written to: {file_path}")
     except Exception as e:
         print(f"Error writing TXT file {file_path}: {str(e)}")
 
-def clean_string(s, keywords):
+# ================= [新增] 带缓存的名称清洗器 =================
+class NameCleaner:
+    """
+    名称清洗器，结果与按顺序逐个 str.replace 关键字完全一致：
+    关键字按原顺序逐个替换，不包含时跳过替换；重复的单字符关键字只保留第一次
+    （删除字符不会拼出新的单字符）；多字符关键字保持原顺序（删除前面的关键字可能拼出
+    后面的多字符关键字，如 "🇨-🇳"，一次性的交替正则无法复现），清洗结果按名称做 LRU 缓存
+    """
+    def __init__(self, keywords, cache_size=None):
+        self.keywords = []
+        seen_chars = set()
+        for keyword in keywords:
+            if not keyword:
+                continue
+            if len(keyword) == 1:
+                if keyword in seen_chars:
+                    continue
+                seen_chars.add(keyword)
+            self.keywords.append(keyword)
+        self._cached_clean = lru_cache(maxsize=cache_size or NAME_CLEAN_CACHE_SIZE)(self._clean)
+
+    def _clean(self, s):
+        cleaned = s
+        for keyword in self.keywords:
+            if keyword in cleaned:
+                cleaned = cleaned.replace(keyword, '')
+        cleaned = cleaned.strip()
+        return sys.intern(cleaned) if cleaned else '未命名'
+
+    def clean(self, s):
+        """
+        清洗名称，非字符串原样返回
+        :param s: 原始名称
+        :return: 清洗后的名称
+        """
+        if not isinstance(s, str):
+            return s
+        return self._cached_clean(s)
+
+_NAME_CLEANERS = {}
+
+def get_name_cleaner(keywords):
     """
-    清理字符串，移除指定关键字
-    :param s: 原始字符串
+    获取（并缓存）指定关键字列表对应的清洗器
     :param keywords: 要移除的关键字列表
-    :return: 清理后的字符串
+    :return: NameCleaner 实例
     """
-    if not isinstance(s, str):
-        return s
-    cleaned = s
-    for keyword in keywords:
-        cleaned = cleaned.replace(keyword, '')
-    cleaned = cleaned.strip()
-    return cleaned if cleaned else '未命名'
+    key = tuple(keywords)
+    cleaner = _NAME_CLEANERS.get(key)
+    if cleaner is None:
+        cleaner = _NAME_CLEANERS[key] = NameCleaner(key)
+    return cleaner
+# =========================================================
 
 def should_exclude_from_aggregation(channel_name):
     """
@@ -818,88 +2779,209 @@ def custom_channel_sort_key(channel_name):
         # 没有数字部分，直接返回字符串
         return (channel_name, 0)
 
-def merge_lives_groups(lives):
+def iter_lives_channels(lives):
     """
-    合并 lives 数组中的重复分组和频道
-    使用 URL 聚合并统计次数的算法
+    将 group 格式的 lives 展开为 (清洗后分组名, 清洗后频道名, 原始 URL 列表) 的频道行
+    名称清洗结果由清洗器缓存并驻留，在各统计字典间共享
     :param lives: lives 数组
-    :return: 合并后的 lives 数组
+    :return: 频道行的生成器
     """
-    if not isinstance(lives, list):
-        return []
-    
-    # 1. 按 URL 聚合并统计次数
-    url_to_group_stats = {}  # URL -> {分组名: 出现次数}
-    url_to_channel_stats = {}  # URL -> {频道名: 出现次数}
-    
+    clean_group_name = get_name_cleaner(GROUP_NAME_CLEAN_KEYWORDS).clean
+    clean_channel_name = get_name_cleaner(CHANNEL_NAME_CLEAN_KEYWORDS).clean
+
     for group_item in lives:
         if not isinstance(group_item, dict):
             continue
         
         # 清洗分组名
-        original_group_name = group_item.get('group', '未分组')
-        cleaned_group_name = clean_string(original_group_name, GROUP_NAME_CLEAN_KEYWORDS)
-        
-        channels = group_item.get('channels', [])
+        cleaned_group_name = clean_group_name(group_item.get('group', '未分组'))
         
-        for channel_item in channels:
+        for channel_item in group_item.get('channels', []):
             if not isinstance(channel_item, dict):
                 continue
             
-            original_channel_name = channel_item.get('name', '未命名')
             # 清洗频道名（对所有情况都生效）
-            cleaned_channel_name = clean_string(original_channel_name, CHANNEL_NAME_CLEAN_KEYWORDS)
-            
-            urls = channel_item.get('urls', [])
+            cleaned_channel_name = clean_channel_name(channel_item.get('name', '未命名'))
             
-            for url in urls:
-                if not url:
-                    continue
-                
-                # 更新分组统计
-                if url not in url_to_group_stats:
-                    url_to_group_stats[url] = {}
-                # 对所有情况都使用清洗后的分组名
-                url_to_group_stats[url][cleaned_group_name] = url_to_group_stats[url].get(cleaned_group_name, 0) + 1
-                
-                # 更新频道统计
-                if url not in url_to_channel_stats:
-                    url_to_channel_stats[url] = {}
-                url_to_channel_stats[url][cleaned_channel_name] = url_to_channel_stats[url].get(cleaned_channel_name, 0) + 1
+            yield cleaned_group_name, cleaned_channel_name, channel_item.get('urls', [])
+
+def iter_lives_rows(lives):
+    """
+    将 group 格式的 lives 展开为紧凑的 (清洗后分组名, 清洗后频道名, URL) 元组行，跳过空 URL
+    :param lives: lives 数组
+    :return: 元组行的生成器
+    """
+    for cleaned_group_name, cleaned_channel_name, urls in iter_lives_channels(lives):
+        for url in urls:
+            if url:
+                yield cleaned_group_name, cleaned_channel_name, url
+
+# ================= [新增] 列式整数编码的 lives 聚合 =================
+def aggregate_lives_dict(rows):
+    """
+    原有的嵌套字典统计：为每个 URL 选择出现次数最多的分组和频道
+    :param rows: (清洗后分组名, 清洗后频道名, URL) 元组行
+    :return: {URL: (分组名, 频道名)}，按 URL 首次出现顺序
+    """
+    url_to_group_stats = {}  # URL -> {分组名: 出现次数}
+    url_to_channel_stats = {}  # URL -> {频道名: 出现次数}
+    
+    for cleaned_group_name, cleaned_channel_name, url in rows:
+        # 更新分组统计
+        if url not in url_to_group_stats:
+            url_to_group_stats[url] = {}
+        # 对所有情况都使用清洗后的分组名
+        url_to_group_stats[url][cleaned_group_name] = url_to_group_stats[url].get(cleaned_group_name, 0) + 1
+        
+        # 更新频道统计
+        if url not in url_to_channel_stats:
+            url_to_channel_stats[url] = {}
+        url_to_channel_stats[url][cleaned_channel_name] = url_to_channel_stats[url].get(cleaned_channel_name, 0) + 1
     
-    # 2. 为每个 URL 选择出现次数最多的分组和频道
     url_to_best_match = {}
     for url, group_stats in url_to_group_stats.items():
         best_group = get_most_frequent(group_stats)
         channel_stats = url_to_channel_stats.get(url, {})
         best_channel = get_most_frequent(channel_stats)
         url_to_best_match[url] = (best_group, best_channel)
+    return url_to_best_match
+
+def rank_names(names):
+    """
+    按 get_most_frequent 的平局规则为名称排名：长度越短、同长度时名称越大，排名越高
+    :param names: 按编号排列的名称列表
+    :return: (编号 -> 排名 的列表, 按排名排列的名称列表)
+    """
+    # 先按名称升序，再按长度稳定降序，等价于按 (-长度, 名称) 升序
+    names_by_rank = sorted(sorted(names), key=len, reverse=True)
+    rank_of_name = dict(zip(names_by_rank, range(len(names_by_rank))))
+    return [rank_of_name[name] for name in names], names_by_rank
+
+def pick_best_ranks(url_col, row_ranks, row_lengths, url_count, rank_count):
+    """
+    统计 (URL 编号, 名称排名) 对的出现次数，为每个 URL 选出次数最多、次数相同时排名最高的名称
+    :param url_col: URL 编号列
+    :param row_ranks: 每个频道行的名称排名
+    :param row_lengths: 每个频道行的 URL 数
+    :param url_count: URL 总数
+    :param rank_count: 名称总数
+    :return: 按 URL 编号排列的最佳名称排名
+    """
+    if numpy is not None:
+        rank_col = numpy.repeat(numpy.array(row_ranks, dtype=numpy.int64), row_lengths)
+        pairs, counts = numpy.unique(url_col * rank_count + rank_col, return_counts=True)
+        pair_urls = pairs // rank_count
+        pair_ranks = pairs % rank_count
+        # 按 URL、次数、排名排序，每个 URL 的最后一项即为最佳
+        order = numpy.lexsort((pair_ranks, counts, pair_urls))
+        sorted_urls = pair_urls[order]
+        last = numpy.flatnonzero(numpy.append(sorted_urls[1:] != sorted_urls[:-1], True))
+        return pair_ranks[order][last].tolist()
+    
+    rank_col = chain.from_iterable(map(repeat, row_ranks, row_lengths))
+    best_counts = [0] * url_count
+    best_ranks = [-1] * url_count
+    for (url_id, rank), pair_count in Counter(zip(url_col, rank_col)).items():
+        best_count = best_counts[url_id]
+        if pair_count > best_count or (pair_count == best_count and rank > best_ranks[url_id]):
+            best_counts[url_id] = pair_count
+            best_ranks[url_id] = rank
+    return best_ranks
+
+def aggregate_lives_columnar(channel_rows):
+    """
+    列式整数编码统计：将 URL、分组名、频道名编码为整数编号后按列计数（有 NumPy 时用排序统计），
+    结果与 aggregate_lives_dict 完全一致（平局规则同 get_most_frequent）
+    :param channel_rows: (清洗后分组名, 清洗后频道名, 原始 URL 列表) 频道行
+    :return: {URL: (分组名, 频道名)}，按 URL 首次出现顺序
+    """
+    flat_urls = []
+    row_lengths = []
+    row_group_ids = []
+    row_channel_ids = []
+    group_ids = {}
+    channel_ids = {}
+    
+    # 分组和频道只按频道行编号一次，URL 展平为一列，逐 URL 的工作都留给 C 层的 dict/map
+    for group_name, channel_name, urls in channel_rows:
+        kept_urls = [url for url in urls if url]
+        if not kept_urls:
+            continue
+        group_id = group_ids.get(group_name)
+        if group_id is None:
+            group_id = group_ids[group_name] = len(group_ids)
+        channel_id = channel_ids.get(channel_name)
+        if channel_id is None:
+            channel_id = channel_ids[channel_name] = len(channel_ids)
+        flat_urls += kept_urls
+        row_lengths.append(len(kept_urls))
+        row_group_ids.append(group_id)
+        row_channel_ids.append(channel_id)
+    
+    if not flat_urls:
+        return {}
+    
+    url_ids = dict(zip(dict.fromkeys(flat_urls), count()))
+    if numpy is not None:
+        url_col = numpy.fromiter(map(url_ids.__getitem__, flat_urls), dtype=numpy.int64, count=len(flat_urls))
+    else:
+        url_col = list(map(url_ids.__getitem__, flat_urls))
+    del flat_urls
+    
+    # 将名称编号换成平局排名，使“次数相同取排名最高”即可还原原有规则
+    group_rank_of_id, groups_by_rank = rank_names(list(group_ids))
+    channel_rank_of_id, channels_by_rank = rank_names(list(channel_ids))
+    best_groups = pick_best_ranks(url_col, list(map(group_rank_of_id.__getitem__, row_group_ids)),
+                                  row_lengths, len(url_ids), len(groups_by_rank))
+    best_channels = pick_best_ranks(url_col, list(map(channel_rank_of_id.__getitem__, row_channel_ids)),
+                                    row_lengths, len(url_ids), len(channels_by_rank))
+    
+    return dict(zip(url_ids, zip(map(groups_by_rank.__getitem__, best_groups),
+                                 map(channels_by_rank.__getitem__, best_channels))))
+# =========================================================
+
+def merge_lives_groups(lives):
+    """
+    合并 lives 数组中的重复分组和频道
+    使用 URL 聚合并统计次数的算法
+    :param lives: lives 数组
+    :return: 合并后的 lives 数组
+    """
+    if not isinstance(lives, list):
+        return []
+    
+    # 1. 按 URL 聚合并统计次数
+    # 2. 为每个 URL 选择出现次数最多的分组和频道
+    engine = LIVES_AGGREGATION_ENGINE
+    if engine == 'auto':
+        engine = 'columnar' if numpy is not None else 'dict'
+    if engine == 'columnar':
+        url_to_best_match = aggregate_lives_columnar(iter_lives_channels(lives))
+    else:
+        url_to_best_match = aggregate_lives_dict(iter_lives_rows(lives))
     
     # 3. 按照频道聚合统计分组次数，合并频道并归入次数最多的分组
+    # url_to_best_match 的键本身不重复，因此下面各 URL 列表无需再做 `in` 去重；
+    # 排除聚合的频道按 (频道名, 分组名) 建立索引，按首次出现顺序保存
     channel_to_group_stats = {}
     channel_to_urls = {}
-    excluded_channels = []  # 存储应排除聚合的频道 [{'channel': channel_name, 'group': group_name, 'urls': [url1, url2, ...]}]
+    excluded_channels = {}  # (channel_name, group_name) -> [url1, url2, ...]
+    exclude_cache = {}  # 频道名 -> 是否排除聚合
     
     for url, (group, channel) in url_to_best_match.items():
         # 检查是否应排除在聚合之外
-        should_exclude = should_exclude_from_aggregation(channel)
+        should_exclude = exclude_cache.get(channel)
+        if should_exclude is None:
+            should_exclude = should_exclude_from_aggregation(channel)
+            exclude_cache[channel] = should_exclude
         
         if should_exclude:
-            # 对于应排除聚合的频道，单独保存
-            # 查找是否已存在相同频道和分组的记录
-            existing_record = None
-            for record in excluded_channels:
-                if record['channel'] == channel and record['group'] == group:
-                    existing_record = record
-                    break
-            
-            if existing_record:
-                # 如果已存在，添加 URL
-                if url not in existing_record['urls']:
-                    existing_record['urls'].append(url)
+            # 对于应排除聚合的频道，按频道和分组单独保存
+            excluded_urls = excluded_channels.get((channel, group))
+            if excluded_urls is None:
+                excluded_channels[(channel, group)] = [url]
             else:
-                # 如果不存在，创建新记录
-                excluded_channels.append({'channel': channel, 'group': group, 'urls': [url]})
+                excluded_urls.append(url)
         else:
             # 统计频道的分组次数
             if channel not in channel_to_group_stats:
@@ -909,8 +2991,7 @@ def merge_lives_groups(lives):
             # 收集频道的所有 URL
             if channel not in channel_to_urls:
                 channel_to_urls[channel] = []
-            if url not in channel_to_urls[channel]:
-                channel_to_urls[channel].append(url)
+            channel_to_urls[channel].append(url)
     
     # 为每个频道选择出现次数最多的分组
     channel_to_best_group = {}
@@ -921,63 +3002,52 @@ def merge_lives_groups(lives):
     # 不需要在这里合并应排除聚合的频道，因为它们会在步骤 4 中单独处理
     
     # 4. 构建分组-频道-URL 的结构
+    # 是否排除聚合只取决于频道名，两类频道不会落到同一个 (分组, 频道) 上，且各自的键唯一，直接建立条目即可
     group_channel_map = {}
     # 处理不应排除聚合的频道
     for channel, best_group in channel_to_best_group.items():
-        urls = channel_to_urls[channel]
         if best_group not in group_channel_map:
             group_channel_map[best_group] = {}
-        if channel not in group_channel_map[best_group]:
-            group_channel_map[best_group][channel] = []
-        # 合并所有 URL
-        for url in urls:
-            if url not in group_channel_map[best_group][channel]:
-                group_channel_map[best_group][channel].append(url)
+        group_channel_map[best_group][channel] = list(channel_to_urls[channel])
     
     # 处理应排除聚合的频道，保持原分组
-    for record in excluded_channels:
-        channel = record['channel']
-        group = record['group']
-        urls = record['urls']
-        
+    for (channel, group), urls in excluded_channels.items():
         if group not in group_channel_map:
             group_channel_map[group] = {}
-        if channel not in group_channel_map[group]:
-            group_channel_map[group][channel] = []
-        # 合并所有 URL
-        for url in urls:
-            if url not in group_channel_map[group][channel]:
-                group_channel_map[group][channel].append(url)
+        group_channel_map[group][channel] = list(urls)
     
     # 5. 如果分组下只有1个频道，且分组和频道名相同的，则将这些都合并到一个分组中，分组名"单剧"，频道名使用原频道名
     single_drama_group = "单剧"
     group_channel_map[single_drama_group] = {}
     
-    # 收集需要移动的频道
+    # 收集需要移动的频道，同时建立 频道名 -> 所在分组 的索引（dict 作为有序集合）
     channels_to_move = []
+    channel_to_groups = {}
     for group_name, channels in group_channel_map.items():
+        for channel_name in channels:
+            if channel_name not in channel_to_groups:
+                channel_to_groups[channel_name] = {}
+            channel_to_groups[channel_name][group_name] = None
         if group_name == single_drama_group:
             continue
         if len(channels) == 1:
-            channel_name = list(channels.keys())[0]
+            channel_name = next(iter(channels))
             if group_name == channel_name:
                 channels_to_move.append((channel_name, channels[channel_name]))
     
     # 移动频道到"单剧"分组
+    # 候选频道名互不相同（即各自的分组名），移动一个频道不会影响其他候选所在分组的索引
+    single_drama_channels = group_channel_map[single_drama_group]
     for channel_name, urls in channels_to_move:
         # 从原分组中移除
-        for group_name, channels in list(group_channel_map.items()):
-            if channel_name in channels:
-                del channels[channel_name]
-                # 如果分组为空，则删除分组
-                if not channels:
-                    del group_channel_map[group_name]
+        for group_name in channel_to_groups.pop(channel_name, ()):
+            channels = group_channel_map[group_name]
+            del channels[channel_name]
+            # 如果分组为空，则删除分组
+            if not channels:
+                del group_channel_map[group_name]
         # 添加到"单剧"分组
-        if channel_name not in group_channel_map[single_drama_group]:
-            group_channel_map[single_drama_group][channel_name] = []
-        for url in urls:
-            if url not in group_channel_map[single_drama_group][channel_name]:
-                group_channel_map[single_drama_group][channel_name].append(url)
+        single_drama_channels[channel_name] = list(urls)
     
     # 6. 按照自定义规则排序分组，分组内按照频道名顺向排序
     # 转换为标准格式并排序
@@ -1013,7 +3083,11 @@ def merge_lives_groups(lives):
             continue
         
         # 按照频道名顺向排序，支持字符串和末尾数字排序
-        sorted_channels = sorted(channels.items(), key=lambda x: custom_channel_sort_key(x[0]))
+        # 规范化输出时以频道名作为次级排序键，避免同键频道的顺序依赖输入顺序
+        if CANONICAL_OUTPUT:
+            sorted_channels = sorted(channels.items(), key=lambda x: (custom_channel_sort_key(x[0]), x[0]))
+        else:
+            sorted_channels = sorted(channels.items(), key=lambda x: custom_channel_sort_key(x[0]))
         
         merged_channels = []
         for channel_name, urls in sorted_channels:
@@ -1052,21 +3126,51 @@ def validate_lives(lives, output_m3u_path=None, output_txt_path=None):
         return []
     
     valid_lives = []
-    for element in lives:
-        if validate_lives_element(element):
+    rejections = Counter()  # 拒绝原因 -> 元素数，汇总输出而不是逐个打印
+    converted_elements = 0
+    converted_groups = 0
+    failed_elements = 0
+    
+    # 先验证全部元素并收集需要下载的播放列表，批量展开后再按原位置拼接，保持聚合输入的顺序
+    element_valid = [validate_lives_element(element, rejections) for element in lives]
+    playlist_positions = {}
+    playlists = []
+    for index, element in enumerate(lives):
+        if element_valid[index]:
+            continue
+        url, playlist_type = get_playlist_type(element)
+        if playlist_type:
+            playlist_positions[index] = len(playlists)
+            playlists.append((url, playlist_type))
+    expanded = expand_playlists(playlists)
+    
+    for index, element in enumerate(lives):
+        if element_valid[index]:
             valid_lives.append(element)
         else:
             # 尝试转换为group格式
-            print("[Validate] 尝试转换非合法元素为group格式")
-            converted = convert_to_group_format(element)
+            if index in playlist_positions:
+                converted = expanded[playlist_positions[index]]
+            else:
+                converted = convert_to_group_format(element)
             if converted and isinstance(converted, list):
-                print(f"[Validate] 转换成功，添加 {len(converted)} 个group元素")
                 valid_lives.extend(converted)
+                converted_elements += 1
+                converted_groups += len(converted)
             elif converted:
-                print("[Validate] 转换成功，添加1个group元素")
                 valid_lives.append(converted)
+                converted_elements += 1
+                converted_groups += 1
             else:
-                print("[Validate] 转换失败，跳过该元素")
+                failed_elements += 1
+    
+    if rejections:
+        summary = '，'.join(f"{reason} {count} 个" for reason, count in rejections.most_common())
+        print(f"[Validate] lives 元素未通过验证：{summary}")
+    if converted_elements:
+        print(f"[Validate] 转换为group格式：{converted_elements} 个元素，添加 {converted_groups} 个group元素")
+    if failed_elements:
+        print(f"[Validate] 转换失败，跳过 {failed_elements} 个元素")
     
     # 当调试模式为true时，输出转换后的valid_lives
     if DEBUG_MODE:
@@ -1117,66 +3221,152 @@ def validate_sites(sites):
 
 def write_json_to_file(data, file_path=OUTPUT_FILE_PATH):
     try:
-        with open(file_path, 'w', encoding='utf-8') as output_file:
-            json.dump(data, output_file, indent=4, ensure_ascii=False)
-        print(f"Data written to JSON file: {file_path}")
+        # 规范化输出时按键名排序，保证序列化结果稳定
+        content = json.dumps(data, indent=4, ensure_ascii=False, sort_keys=CANONICAL_OUTPUT)
+        if write_text_if_changed(file_path, content):
+            print(f"Data written to JSON file: {file_path}")
     except Exception as e:
         print(f"Error writing data to JSON file {file_path}: {str(e)}")
 
-# ================= [新增] 深度递归替换相对路径函数 ==================
-def deep_replace_relative_paths(obj, base_url):
+# ================= [新增] 规范化输出 =================
+def write_text_if_changed(file_path, content):
     """
-    深度递归遍历对象，替换字典中以 "./" 开头的字符串值
-    :param obj: 当前遍历的对象 (dict/list/str)
-    :param base_url: 用于拼接的基准 URL
+    内容与现有文件相同时跳过写入，保留文件的修改时间，使 nginx 的 ETag/304 继续有效
+    :param file_path: 文件路径
+    :param content: 文本内容
+    :return: 是否写入了文件
     """
-    # 需求 1：如果是本地文件源，不做处理
-    if base_url.startswith((".", "/")):
-        return
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                print(f"[Output] 内容未变化，跳过写入: {file_path}")
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return True
 
-    if isinstance(obj, dict):
-        for key, value in obj.items():
-            if isinstance(value, str):
-                # 需求 3：值为字符串且以 "./" 开头
-                if value.startswith("./"):
-                    # 需求 4：使用 urljoin 进行标准拼接
-                    obj[key] = urljoin(base_url, value)
-            else:
-                # 递归处理下一层（不限制深度）
-                deep_replace_relative_paths(value, base_url)
-    elif isinstance(obj, list):
-        # 如果是列表，遍历其中的元素继续递归
-        for item in obj:
-            deep_replace_relative_paths(item, base_url)
-# =================================================================
-
-def add_original_url(url, d):
-    if 'originalUrl' not in d:
-        d['originalUrl'] = []
-    if isinstance(d['originalUrl'], str):
-        d['originalUrl'] = [d['originalUrl'], url]
-    else:
-        d['originalUrl'].append(url)
+def canonical_item_key(item):
+    """
+    规范化排序键：优先按元素标识（key/id/name），再按规范化 JSON 区分
+    """
+    identifier = get_list_item_identifier(item) if isinstance(item, dict) else None
+    serialized = json.dumps(item, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return ('' if identifier is None else str(identifier), serialized)
 
-def preprocess_single_dict(url, d):
+def canonicalize_output(data):
     """
-    针对单个单仓字典进行预处理
+    按 CANONICAL_SORTED_LISTS 原地排序输出中的列表（lives 在合并时已按固定规则排序）
+    :param data: 合并后的字典
     """
-    add_original_url(url, d)
+    for list_path in CANONICAL_SORTED_LISTS:
+        parent = data
+        *parents, last = list_path.split('.')
+        for key in parents:
+            parent = parent.get(key) if isinstance(parent, dict) else None
+        if isinstance(parent, dict) and isinstance(parent.get(last), list):
+            parent[last].sort(key=canonical_item_key)
+            print(f"[Canonical] {list_path}: 已按标识排序 {len(parent[last])} 个元素")
+# =========================================================
+
+# ================= [新增] 来源追溯表 =================
+class ProvenanceTable:
+    """
+    来源追溯表：来源 URL -> 整数编号，列表元素标识 -> 提供该元素的来源编号列表
+    代替写入每个单仓字典（并随合并进入输出）的 originalUrl 字符串列表
+    """
+    def __init__(self):
+        self.source_ids = {}
+        self.items = {}
+
+    def source_id(self, url):
+        """
+        获取来源编号（按合并顺序首次出现时分配）
+        """
+        return self.source_ids.setdefault(url, len(self.source_ids))
+
+    def tag_items(self, path, items, source_id):
+        """
+        登记列表中带标识（key/id/name）的元素由该来源提供
+        :param path: 列表所在的字典路径，如 sites、video.sites
+        :param items: 列表
+        :param source_id: 来源编号
+        """
+        section = None
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            identifier = get_list_item_identifier(item)
+            if identifier is None or isinstance(identifier, (dict, list)):
+                continue
+            if section is None:
+                section = self.items.setdefault(path, {})
+            ids = section.setdefault(str(identifier), [])
+            if not ids or ids[-1] != source_id:
+                ids.append(source_id)
+
+    def write(self, file_path):
+        sources = sorted(self.source_ids, key=self.source_ids.get)
+        try:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump({'sources': sources, 'items': self.items}, f,
+                          ensure_ascii=False, separators=(',', ':'))
+            print(f"[Provenance] 来源追溯表已写入: {file_path} ({len(sources)} 个来源)")
+        except OSError as e:
+            print(f"[Provenance] 写入失败 {file_path}: {e}")
+
+def query_provenance(file_path, identifier):
+    """
+    查询哪些来源提供了指定标识（key/id/name）的元素
+    :param file_path: 来源追溯表文件
+    :param identifier: 元素标识
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        table = json.load(f)
+    sources = table['sources']
+    found = False
+    for section, items in table['items'].items():
+        if identifier in items:
+            found = True
+            print(f"[{section}] {identifier}:")
+            for source_id in items[identifier]:
+                print(f"  {sources[source_id]}")
+    if not found:
+        print(f"未找到标识为 {identifier} 的元素")
+
+PROVENANCE = ProvenanceTable()
+# =========================================================
+
+def preprocess_single_dict(url, d, provenance=None):
+    """
+    针对单个单仓字典进行预处理：一次遍历完成 sites 相对路径改写与来源追溯登记
+    :param url: 来源 URL 或本地路径
+    :param d: 单仓字典
+    :param provenance: 来源追溯表（可选）
+    """
+    # 来源自带的 originalUrl（例如引用了其他合并结果）只用于确定相对路径的基准，不再写入输出
+    upstream_urls = d.pop('originalUrl', None)
+    if isinstance(upstream_urls, str):
+        upstream_urls = [upstream_urls]
 
     # 需求 2：不再单独处理 spider 字段
 
     # 需求 3：处理顶级 sites 下的字段
+    base_url_for_replace = None
     if "sites" in d:
-        # 确定基准 URL：优先使用 originalUrl 中的第一个，否则使用当前 url（对于本地文件也可以通过该方式进行正确替换）
+        # 确定基准 URL：优先使用来源自带 originalUrl 中的第一个，否则使用当前 url（对于本地文件也可以通过该方式进行正确替换）
         base_url_for_replace = url
-        if "originalUrl" in d and isinstance(d["originalUrl"], list) and d["originalUrl"]:
-            first_original_url = d["originalUrl"][0]
-            if first_original_url and not first_original_url.startswith((".", "/")):
+        if isinstance(upstream_urls, list) and upstream_urls:
+            first_original_url = upstream_urls[0]
+            if isinstance(first_original_url, str) and first_original_url \
+                    and not first_original_url.startswith((".", "/")):
                 base_url_for_replace = first_original_url
 
-        # 执行深度替换
-        deep_replace_relative_paths(d["sites"], base_url_for_replace)
+    # 单次遍历：sites 相对路径改写（需求 1：本地文件源不做处理）与来源追溯登记
+    if base_url_for_replace is not None or provenance is not None:
+        walk_source(d, base_url=base_url_for_replace, provenance=provenance,
+                    source_id=provenance.source_id(url) if provenance is not None else None)
 
 # ================= [新增] 加载默认覆盖文件的函数 =================
 def load_override_file(file_path):
@@ -1197,21 +3387,17 @@ def load_override_file(file_path):
         print(f"[Override] 文件 {file_path} 读取失败或为空，跳过覆盖。")
         return None
 
-    # 清洗注释
-    content = remove_comments_from_string(content)
-    content = content.replace("\n", "").replace("\r", "")
-
-    if not is_json(content):
+    try:
+        parsed = parse_jsonc(content)
+    except (ValueError, RecursionError):
         print(f"[Override] 文件 {file_path} 不是合法的 JSON，跳过覆盖。")
         return None
 
     try:
-        parsed = json.loads(content)
         if isinstance(parsed, dict):
             # 注意：Override 文件是本地文件，传入 url="" 或空，
-            # deep_replace_relative_paths 内部会识别本地路径从而跳过处理，
-            # 但为了保险，这里可以不调用 preprocess_single_dict，
-            # 或者仅调用 add_original_url。
+            # 相对路径改写会识别本地路径从而跳过处理，
+            # 但为了保险，这里可以不调用 preprocess_single_dict。
             # 这里选择仅做最简单的处理，因为 Override 通常是最终结果，不需要再解析相对路 径。
             print(f"[Override] 文件 {file_path} 加载成功，将在最后合并以覆盖参数。")
             return parsed
@@ -1230,17 +3416,36 @@ if __name__ == "__main__":
     output_m3u_path = current_time + "-" + DEFAULT_OUTPUT_M3U_FILE
     output_txt_path = current_time + "-" + DEFAULT_OUTPUT_TXT_FILE
 
-    if len(sys.argv) > 1:
-        input_file_path = sys.argv[1]
-    if len(sys.argv) > 2:
-        output_file_path = sys.argv[2]
-    if len(sys.argv) > 3:
-        output_m3u_path = sys.argv[3]
-    if len(sys.argv) > 4:
-        output_txt_path = sys.argv[4]
-
-    # 1. 处理输入，获取原始数据
-    raw_data_map, valid_sources, invalid_sources = process_input_file(input_file_path)
+    # 以 -- 开头的参数为选项，其余为位置参数
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    options = {arg for arg in sys.argv[1:] if arg.startswith('--')}
+    # --incremental：开启增量合并，从未变化的来源前缀的检查点继续合并（默认从头完整合并）
+    incremental_merge = '--incremental' in options
+    # --benchmark-merge：合并前对比合并引擎与 deepmerge 逐个折叠的耗时与结果
+    benchmark_merge = '--benchmark-merge' in options
+    # --canonical：规范化输出，列表按固定规则排序并按键名排序序列化
+    if '--canonical' in options:
+        CANONICAL_OUTPUT = True
+    # --rewrite-output：写出前按 URL_REPLACEMENTS / KEY_RENAMES 重写合并结果
+    if '--rewrite-output' in options:
+        OUTPUT_REWRITE_ENABLED = True
+
+    # --provenance-query <来源追溯表文件> <标识>：查询提供该元素的来源后退出
+    if '--provenance-query' in options:
+        if len(args) < 2:
+            print("用法: mergeSources.3.0.py --provenance-query <provenance 文件> <key/id/name>")
+            sys.exit(1)
+        query_provenance(args[0], args[1])
+        sys.exit(0)
+
+    if len(args) > 0:
+        input_file_path = args[0]
+    if len(args) > 1:
+        output_file_path = args[1]
+    if len(args) > 2:
+        output_m3u_path = args[2]
+    if len(args) > 3:
+        output_txt_path = args[3]
 
     # 利用 Pathlib 处理文件名
     p = Path(input_file_path)
@@ -1252,8 +3457,9 @@ if __name__ == "__main__":
     # 定义新生成的文件名
     tmp_valid_path = p.parent / f"tmp.{filename}.valid-json"
     invalid_history_path = p2.parent / f"{filename}.invalid-json-history"
+    invalid_report_path = p2.parent / f"{filename}.invalid-json-report"
     
-    # 提前读取无效历史文件，用于后续过滤
+    # 提前读取无效历史文件（仅用于去重追加，过滤改由负缓存负责）
     invalid_history_set = set()
     if invalid_history_path.exists():
         try:
@@ -1266,6 +3472,13 @@ if __name__ == "__main__":
         except Exception as e:
             print(f"Warning: Could not read invalid history file {invalid_history_path}: {e}")
 
+    # 首次启用负缓存时，从无效历史迁移
+    if not NEGATIVE_CACHE.exists() and invalid_history_set:
+        NEGATIVE_CACHE.seed_from_history(sorted(invalid_history_set), invalid_history_path.stat().st_mtime)
+
+    # 1. 处理输入，获取原始数据
+    raw_data_map, valid_sources, invalid_sources = process_input_file(input_file_path)
+
     # 收集所有输入的 URL（用于过滤）
     all_input_urls = set(raw_data_map.keys())
 
@@ -1278,64 +3491,54 @@ if __name__ == "__main__":
     print("Starting Classification & Deep Scan")
     print("="*30)
 
-    for url, data in raw_data_map.items():
+    # 待合并的单仓 [(排序键, url, data)]，排序键保证子仓紧跟在其所属多仓之后
+    resolved_singles = []
+    multi_repos = []
+
+    for index, (url, data) in enumerate(raw_data_map.items()):
         if is_single_cang(data):
             print(f"[Single] {url}")
-            single_urls.append(url)
-            # 预处理并加入合并队列
-            preprocess_single_dict(url, data)
-            final_dicts_to_merge.append(data)
+            resolved_singles.append(((index,), url, data))
         else:
-            print(f"[Multi]  {url} -> Starting deep scan...")
+            print(f"[Multi]  {url} -> Queued for deep scan")
             multi_urls.append(url)
             # 加入有效源列表，确保多仓URL会被写入到输入文件
             valid_sources.append(url)
-            # 深度遍历提取 URL
-            extracted_sub_urls = extract_urls_deep(data)
-            # 去重
-            extracted_sub_urls = list(dict.fromkeys(extracted_sub_urls))
-
-            print(f"  Found {len(extracted_sub_urls)} potential URLs.")
-
-            # 过滤 URL
-            filtered_sub_urls = []
-            for sub_url in extracted_sub_urls:
-                # 检查是否在输入文件的 URL 中存在
-                if sub_url in all_input_urls:
-                    print(f"  [Filter] Skipping URL (exists in input): {sub_url}")
-                    continue
-                # 检查是否在无效历史文件中存在
-                if sub_url in invalid_history_set:
-                    print(f"  [Filter] Skipping URL (exists in invalid history): {sub_url}")
-                    continue
-                # 通过过滤，添加到处理列表
-                filtered_sub_urls.append(sub_url)
-            
-            print(f"  After filtering: {len(filtered_sub_urls)} URLs to process")
-
-            # 尝试解析每一个过滤后的 URL
-            for sub_url in filtered_sub_urls:
-                sub_data = fetch_and_parse_single_cang(sub_url)
-                if sub_data:
-                    print(f"  [OK] Resolved as single仓: {sub_url}")
-                    preprocess_single_dict(sub_url, sub_data)
-                    final_dicts_to_merge.append(sub_data)
-                    # 加入单仓URL列表，视同输入文件中的单仓处理
-                    single_urls.append(sub_url)
-                    # 加入有效源列表，确保会被写入到临时有效文件
-                    valid_sources.append(sub_url)
-                else:
-                    print(f"  [SKIP] Not valid JSON or not dict: {sub_url}")
-                    # 加入无效源列表，视同输入文件中的无效处理
-                    invalid_sources.append(sub_url)
+            multi_repos.append(((index,), url, data))
+
+    # 并发爬取多仓中的子 URL，并展开嵌套多仓
+    crawled_singles, nested_multi_urls, failed_sub_urls = crawl_multi_repos(multi_repos, all_input_urls)
+    resolved_singles.extend(crawled_singles)
+    # 嵌套多仓视同输入文件中的多仓处理
+    multi_urls.extend(nested_multi_urls)
+    valid_sources.extend(nested_multi_urls)
+    # 加入无效源列表，视同输入文件中的无效处理
+    invalid_sources.extend(failed_sub_urls)
+
+    resolved_singles.sort(key=lambda item: item[0])
+    for order_key, url, data in resolved_singles:
+        # 预处理并加入合并队列
+        preprocess_single_dict(url, data, PROVENANCE)
+        final_dicts_to_merge.append(data)
+        single_urls.append(url)
+        # 子仓加入有效源列表，确保会被写入到临时有效文件
+        if len(order_key) > 1:
+            valid_sources.append(url)
 
     # ================= [修改] 加载覆盖文件，添加到待合并列表最后 =================
     override_data = load_override_file(DEFAULT_OVERRIDE_FILE)
+    override_lives = None
     if override_data:
         print(f"[Override] Adding override data to merge list")
+        walk_source(override_data, provenance=PROVENANCE, source_id=PROVENANCE.source_id(DEFAULT_OVERRIDE_FILE))
         final_dicts_to_merge.append(override_data)
+        # 单独保留 override 的 lives，不受合并后续处理的影响（完整合并与增量合并结果一致）
+        if 'lives' in override_data:
+            override_lives = copy.deepcopy(override_data['lives'])
     # ==========================================================
 
+    report_peak_rss("来源抓取与解析完成")
+
     # 3. 写入分类文件
     write_list_to_file(single_file_path, single_urls)
     write_list_to_file(multi_file_path, multi_urls)
@@ -1344,7 +3547,14 @@ if __name__ == "__main__":
     print("\n" + "="*30)
     print(f"Merging {len(final_dicts_to_merge)} single仓 data...")
     print("="*30)
-    final_merged_dict = merge_dicts(final_dicts_to_merge)
+    if benchmark_merge:
+        run_merge_benchmark(final_dicts_to_merge)
+    if incremental_merge:
+        print("[Merge] --incremental：增量合并")
+        final_merged_dict = merge_dicts_incremental(final_dicts_to_merge)
+    else:
+        final_merged_dict = merge_dicts(final_dicts_to_merge)
+    report_peak_rss("合并完成")
 
     # 6. 验证并清理 lives 数组
     if 'lives' in final_merged_dict:
@@ -1352,11 +3562,12 @@ if __name__ == "__main__":
         print("Validating lives array")
         print("="*30)
         final_merged_dict['lives'] = validate_lives(final_merged_dict['lives'], output_m3u_path, output_txt_path)
+        report_peak_rss("lives 验证完成")
         
         # 检查 override 文件是否存在顶层 lives 字段
-        if override_data and 'lives' in override_data:
+        if override_lives is not None:
             print("[Override] Using lives from override file instead of merged result")
-            final_merged_dict['lives'] = override_data['lives']
+            final_merged_dict['lives'] = override_lives
 
     # 7. 验证并清理 sites 数组
     if 'video' in final_merged_dict and 'sites' in final_merged_dict['video']:
@@ -1384,7 +3595,16 @@ if __name__ == "__main__":
     else:
         print("No extra fields found")
 
-    # 9. 写入 JSON 结果文件
+    # 9. 按 URL_REPLACEMENTS / KEY_RENAMES 重写输出
+    if OUTPUT_REWRITE_ENABLED:
+        URL_REWRITER.rewrite_tree(final_merged_dict)
+        URL_REWRITER.print_summary()
+
+    # 10. 规范化输出
+    if CANONICAL_OUTPUT:
+        canonicalize_output(final_merged_dict)
+
+    # 11. 写入 JSON 结果文件
     write_json_to_file(final_merged_dict, output_file_path)
 
     # ================= 原有文件更新逻辑 =================
@@ -1398,5 +3618,26 @@ if __name__ == "__main__":
         # 更新无效历史集合
         invalid_history_set.add(src)
 
+    # 记录本次运行无效源及原因
+    write_list_to_file(invalid_report_path,
+                       [f"{src}\t{get_invalid_reason(src)}" for src in dict.fromkeys(invalid_sources)])
+
     # 使用 tmp.valid-json 覆盖原输入文件
     replace_file(tmp_valid_path, input_file_path)
+
+    # ================= [新增] 抓取缓存淘汰与统计 =================
+    if FETCH_CACHE_ENABLED:
+        FETCH_CACHE.evict()
+        FETCH_CACHE.print_summary()
+    if PARSE_CACHE_ENABLED:
+        PARSE_CACHE.save()
+        PARSE_CACHE.print_summary()
+    ENCODING_MEMORY.save()
+    ENCODING_MEMORY.print_summary()
+    NEGATIVE_CACHE.save()
+    NEGATIVE_CACHE.print_summary()
+    HOST_STATS.save()
+    HOST_STATS.write_report(p2.parent / f"{filename}.host-report.json")
+    SOURCE_REPORT.write(p2.parent / f"{filename}.source-report.csv")
+    PROVENANCE.write(p2.parent / f"{filename}.provenance.json")
+    report_peak_rss("运行结束")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 lives 的验证与合并结果与原实现的输出一致
+输入：script/merge-sources/tv.original.lives.json 与 debug_original_lives.json 中的 lives
+期望：script/merge-sources/test_lives_baseline.expected.json（由原实现生成）
+远程 m3u/txt 播放列表不访问网络，按 URL 生成确定的离线内容，新旧实现使用相同的内容
+
+运行：python test_lives_baseline.py（或 pytest）
+重新生成期望结果：python test_lives_baseline.py --write-fixture <原实现的 mergeSources.3.0.py>
+例如先 git show <baseline>:script/merge-sources/mergeSources.3.0.py > /tmp/baseline.py
+"""
+
+import copy
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+INPUT_FILES = ['tv.original.lives.json', 'debug_original_lives.json']
+FIXTURE_FILE = os.path.join(SCRIPT_DIR, 'test_lives_baseline.expected.json')
+
+# 离线播放列表内容使用的名称与 URL，包含需要清洗的关键字、排除聚合的频道名与“单剧”结构
+PLAYLIST_GROUPS = ['央视频道', '📺卫视频道', '卫视·频道', '港澳台', '体育-频道', '电影_频道', '少儿', '地方频道']
+PLAYLIST_CHANNELS = ['CCTV-1', 'CCTV1', 'CCTV-5', '湖南卫视', '湖南-卫视', '浙江卫视', '凤凰中文', '翡翠台',
+                     'TVB', '第1集', '第2集', '电影', '体育']
+PLAYLIST_URL_COUNT = 400
+
+
+def load_module(name, file_path):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, file_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def offline_playlist_content(url, timeout=None):
+    """
+    按 URL 生成确定的播放列表内容（.m3u 为 m3u 格式，其余为 txt 格式，部分 txt 为 m3u 内容）
+    """
+    rnd = random.Random(hashlib.sha1(url.encode('utf-8')).hexdigest())
+    as_m3u = url.lower().endswith('.m3u') or rnd.random() < 0.2
+    lines = ['#EXTM3U'] if as_m3u else []
+    for _ in range(rnd.randrange(1, 6)):
+        if rnd.random() < 0.15:
+            # 分组下只有一个同名频道，合并时归入“单剧”
+            drama = f"剧集{rnd.randrange(20)}"
+            group, channels = drama, [drama]
+        else:
+            group = rnd.choice(PLAYLIST_GROUPS)
+            channels = [rnd.choice(PLAYLIST_CHANNELS) for _ in range(rnd.randrange(1, 8))]
+        if not as_m3u:
+            lines.append(f"{group},#genre#")
+        for channel in channels:
+            urls = [f"http://live.example/{rnd.randrange(PLAYLIST_URL_COUNT)}.m3u8"
+                    for _ in range(rnd.randrange(1, 4))]
+            if as_m3u:
+                for channel_url in urls:
+                    lines.append(f'#EXTINF:-1 group-title="{group}",{channel}')
+                    lines.append(channel_url)
+            else:
+                lines.append(f"{channel},{'#'.join(urls)}")
+    return '\n'.join(lines)
+
+
+def load_inputs():
+    inputs = {}
+    for file_name in INPUT_FILES:
+        with open(os.path.join(SCRIPT_DIR, file_name), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        inputs[file_name] = data.get('lives', []) if isinstance(data, dict) else data
+    return inputs
+
+
+def build_outputs(module):
+    """
+    用给定实现计算各输入的 merge_lives_groups 与 validate_lives 结果
+    """
+    module.DEBUG_MODE = False
+    module.get_url_content = offline_playlist_content
+    outputs = {}
+    for file_name, lives in load_inputs().items():
+        outputs[f"{file_name}:merge_lives_groups"] = module.merge_lives_groups(copy.deepcopy(lives))
+        outputs[f"{file_name}:validate_lives"] = module.validate_lives(copy.deepcopy(lives))
+    return outputs
+
+
+def test_lives_match_baseline():
+    with open(FIXTURE_FILE, 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+    actual = build_outputs(load_module('mergeSources', os.path.join(SCRIPT_DIR, 'mergeSources.3.0.py')))
+    assert list(actual) == list(expected)
+    for name in expected:
+        # 按序列化结果比较，分组、频道与 URL 的顺序也必须一致
+        assert json.dumps(actual[name], ensure_ascii=False) == json.dumps(expected[name], ensure_ascii=False), name
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--write-fixture':
+        outputs = build_outputs(load_module('baseline', sys.argv[2]))
+        with open(FIXTURE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(outputs, f, ensure_ascii=False, indent=1)
+            f.write('\n')
+        for name, lives in outputs.items():
+            print(f"[Test] {name}: {len(lives)} 个分组")
+        print(f"[Test] 期望结果已写入: {FIXTURE_FILE}")
+        return 0
+
+    try:
+        test_lives_match_baseline()
+    except AssertionError as e:
+        print(f"[Error] lives 结果与原实现不一致: {e}")
+        return 1
+    print("[Test] lives 验证与合并结果与原实现一致")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 mergeSources.3.0.py 中重写的热点路径：与原实现的结果一致，或与固定的期望结果一致
+既可以直接运行（任一项失败时退出码非 0），也可以用 pytest 运行
+"""
+
+import copy
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+
+def load_module(name, file_name):
+    """
+    按文件路径加载脚本（文件名中含有 '.'，不能直接 import）
+    模块注册到 sys.modules，增量合并的检查点才能被 pickle
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SCRIPT_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+merge_sources = load_module('mergeSources', 'mergeSources.3.0.py')
+baseline_lives = load_module('test_merge_lives_3_0', 'test_merge_lives.3.0.py')
+
+
+def dump(obj):
+    """
+    按原样（包括字段与元素顺序）序列化，用于比较结果
+    """
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def load_json_file(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def random_sources(seed, count=40):
+    """
+    生成覆盖各合并分支的随机来源：标识冲突、无标识元素、合并后标识变化、
+    非字典列表、字典与非字典混合列表、嵌套字典中的列表、类型不同的同名字段
+    """
+    rnd = random.Random(seed)
+    sources = []
+    for i in range(count):
+        d = {'spider': f"./jar/{rnd.randrange(5)}.jar"}
+        sites = []
+        for _ in range(rnd.randrange(12)):
+            site = {'api': f"csp_{rnd.randrange(30)}", 'type': rnd.randrange(4)}
+            choice = rnd.random()
+            if choice < 0.5:
+                site['key'] = f"site{rnd.randrange(25)}"
+                if rnd.random() < 0.3:
+                    site['id'] = rnd.randrange(10)
+            elif choice < 0.7:
+                # key 为空时按 name 识别；name 与已有元素的 key 相同时会清空其 key，使其标识变为 id
+                site['key'] = ''
+                site['name'] = rnd.choice([f"名称{rnd.randrange(10)}", f"site{rnd.randrange(25)}"])
+            elif choice < 0.85:
+                site['id'] = rnd.randrange(10)
+            if rnd.random() < 0.3:
+                site['ext'] = {'list': [rnd.randrange(5) for _ in range(3)]}
+            sites.append(site)
+        d['sites'] = sites
+        d['flags'] = [f"flag{rnd.randrange(15)}" for _ in range(rnd.randrange(6))]
+        d['lives'] = [{'group': f"分组{rnd.randrange(6)}",
+                       'channels': [{'name': f"CCTV{rnd.randrange(8)}",
+                                     'urls': [f"http://live/{rnd.randrange(40)}.m3u8"]}]}
+                      for _ in range(rnd.randrange(5))]
+        if rnd.random() < 0.5:
+            # 字典与非字典混合、嵌套列表：走 dedupe_list_items 分支
+            d['ads'] = [rnd.choice([f"ad{rnd.randrange(10)}.com", rnd.randrange(5), [rnd.randrange(3)],
+                                    {'host': f"h{rnd.randrange(3)}"}])
+                        for _ in range(rnd.randrange(6))]
+        if rnd.random() < 0.5:
+            d['video'] = {'sites': [{'key': f"v{rnd.randrange(8)}", 'n': i}],
+                          'meta': {'tags': [f"t{rnd.randrange(4)}"]}}
+        if rnd.random() < 0.3:
+            # 同名字段在不同来源中类型不同
+            d['wallpaper'] = rnd.choice(['http://img/1.png', ['http://img/2.png'], {'url': 'http://img/3.png'}])
+        sources.append(d)
+    return sources
+
+
+def repo_sources():
+    """
+    以仓库中的 JSON 对象文件作为真实来源样本
+    """
+    sources = []
+    for file_name in ('tv.original.lives.json', 'notCorrectlyFormatted.json', 'notCorrectlyFormatted2.json',
+                      'notCorrectlyFormatted3.json', 'notReachableOrTimeout.json', 'notReachableOrTimeout2.json'):
+        data = load_json_file(os.path.join(SCRIPT_DIR, file_name))
+        if isinstance(data, dict):
+            sources.append(data)
+    data = load_json_file(os.path.join(REPO_ROOT, 'web', 'tv.json'))
+    if isinstance(data, dict):
+        sources.append(data)
+    return sources
+
+
+def random_lives(seed, count=300):
+    """
+    生成 URL 在多个分组、频道间重复出现的 lives，名称中包含需要清洗的关键字
+    """
+    rnd = random.Random(seed)
+    group_names = ['央视频道', '卫视·频道', '📺体育', '港澳台', '-电影-', '少儿_频道', '地方', '单剧']
+    channel_names = ['CCTV-1', 'CCTV1', '湖南卫视', '湖南-卫视', '第1集', '凤凰中文', '体育', '电影']
+    lives = []
+    for _ in range(count):
+        channels = []
+        for _ in range(rnd.randrange(1, 5)):
+            urls = [f"http://live/{rnd.randrange(120)}.m3u8" for _ in range(rnd.randrange(4))]
+            if rnd.random() < 0.1:
+                urls.append('')
+            channels.append({'name': rnd.choice(channel_names), 'urls': urls})
+        lives.append({'group': rnd.choice(group_names), 'channels': channels})
+    return lives
+
+
+def repo_lives():
+    """
+    仓库中 lives 样本里的 group 格式元素
+    """
+    lives = []
+    data = load_json_file(os.path.join(SCRIPT_DIR, 'debug_original_lives.json'))
+    if isinstance(data, list):
+        lives.extend(data)
+    data = load_json_file(os.path.join(SCRIPT_DIR, 'tv.original.lives.json'))
+    if isinstance(data, dict):
+        lives.extend(data.get('lives', []))
+    return [item for item in lives if isinstance(item, dict) and 'channels' in item]
+
+
+def test_merge_engine_matches_pairwise():
+    """
+    MergeEngine（merge_dicts）与 deepmerge 逐个折叠（merge_dicts_pairwise）结果一致
+    """
+    samples = [random_sources(seed) for seed in range(20)] + [repo_sources()]
+    for sources in samples:
+        expected = merge_sources.merge_dicts_pairwise(copy.deepcopy(sources))
+        actual = merge_sources.merge_dicts(copy.deepcopy(sources))
+        assert dump(actual) == dump(expected)
+
+
+def test_incremental_merge_matches_full_merge():
+    """
+    增量合并（merge_dicts_incremental）与完整合并（merge_dicts）结果一致，覆盖复用检查点与检查点失效
+    """
+    for seed in range(5):
+        sources = random_sources(seed)
+        changed = copy.deepcopy(sources)
+        changed[0]['spider'] = './jar/changed.jar'
+        runs = [sources, sources, sources[:-5], sources[:-5] + random_sources(seed + 100, 6), changed, sources[3:]]
+        with tempfile.TemporaryDirectory() as state_dir:
+            # 依次模拟：首次运行、无变化、删除末尾来源、新增来源、首个来源变化、删除开头来源
+            for run in runs:
+                expected = merge_sources.merge_dicts(copy.deepcopy(run))
+                actual = merge_sources.merge_dicts_incremental(copy.deepcopy(run), state_dir=state_dir,
+                                                               checkpoint_interval=4)
+                assert dump(actual) == dump(expected)
+
+
+def test_dedupe_keeps_first_seen_order_across_hash_seeds():
+    """
+    字符串列表按首次出现的顺序去重，结果不受字符串哈希种子影响
+    """
+    items = [f"flag{i % 37}" for i in range(500, 0, -3)] + ['b', 'a', 'b', 'c', 'a']
+    expected = list(dict.fromkeys(items))
+    code = ('import importlib.util, json, sys; '
+            'spec = importlib.util.spec_from_file_location("mergeSources", sys.argv[1]); '
+            'module = importlib.util.module_from_spec(spec); spec.loader.exec_module(module); '
+            'print(json.dumps(module.dedupe_list_items(json.loads(sys.argv[2]))))')
+    script_path = os.path.join(SCRIPT_DIR, 'mergeSources.3.0.py')
+    for hash_seed in ('0', '1', '12345'):
+        env = dict(os.environ, PYTHONHASHSEED=hash_seed)
+        output = subprocess.run([sys.executable, '-c', code, script_path, json.dumps(items)],
+                                env=env, capture_output=True, text=True, check=True).stdout
+        assert json.loads(output.strip().splitlines()[-1]) == expected, hash_seed
+
+
+def test_dedupe_mixed_items():
+    """
+    含字典、列表、字符串的混合列表可以去重合并（不抛出 TypeError），键顺序不同的相同字典视为同一元素
+    """
+    items = [{"a": 1, "b": 2}, "x", [1, 2], {"b": 2, "a": 1}, "x", [1, 2], [2, 1], 1, '{"a":1,"b":2}']
+    expected = [{"a": 1, "b": 2}, "x", [1, 2], [2, 1], 1, '{"a":1,"b":2}']
+    assert dump(merge_sources.dedupe_list_items(items)) == dump(expected)
+
+    sources = [{'ads': [{"a": 1, "b": 2}, "x", [1]]}, {'ads': [{"b": 2, "a": 1}, [1], "y"]}]
+    for merge_func in (merge_sources.merge_dicts, merge_sources.merge_dicts_pairwise):
+        merged = merge_func(copy.deepcopy(sources))
+        assert dump(merged['ads']) == dump([{"a": 1, "b": 2}, "x", [1], "y"])
+
+
+def check_lives_aggregation(lives):
+    expected = merge_sources.aggregate_lives_dict(merge_sources.iter_lives_rows(lives))
+    actual = merge_sources.aggregate_lives_columnar(merge_sources.iter_lives_channels(lives))
+    assert list(actual.items()) == list(expected.items())
+
+
+def test_columnar_aggregation_matches_dict():
+    """
+    列式 lives 聚合（aggregate_lives_columnar）与嵌套字典聚合（aggregate_lives_dict）结果与顺序一致
+    """
+    samples = [random_lives(seed) for seed in range(10)] + [repo_lives(), []]
+    numpy_module = merge_sources.numpy
+    try:
+        # 有 NumPy 时分别验证 NumPy 与纯 Python 两种计数实现
+        for numpy_option in ([numpy_module, None] if numpy_module is not None else [None]):
+            merge_sources.numpy = numpy_option
+            for lives in samples:
+                check_lives_aggregation(lives)
+    finally:
+        merge_sources.numpy = numpy_module
+
+
+def test_name_cleaner_matches_clean_string():
+    """
+    NameCleaner 与原 clean_string（test_merge_lives.3.0.py 中保留的原实现）结果一致
+    """
+    rnd = random.Random(0)
+    names = []
+    for keywords in (merge_sources.GROUP_NAME_CLEAN_KEYWORDS, merge_sources.CHANNEL_NAME_CLEAN_KEYWORDS):
+        pieces = list(keywords) + ['🇨', '🇳', 'CCTV', '卫视', ' ', '频', '道', '1']
+        names += [''.join(rnd.choice(pieces) for _ in range(rnd.randrange(8))) for _ in range(3000)]
+    names += ['🇨-🇳', '频-道', ' - ', '', '📺', None, 1]
+    for item in repo_lives():
+        names.append(item.get('group'))
+        names += [channel.get('name') for channel in item['channels'] if isinstance(channel, dict)]
+
+    for keywords in (merge_sources.GROUP_NAME_CLEAN_KEYWORDS, merge_sources.CHANNEL_NAME_CLEAN_KEYWORDS):
+        cleaner = merge_sources.NameCleaner(keywords)
+        for name in names:
+            assert cleaner.clean(name) == baseline_lives.clean_string(name, keywords), name
+
+
+# 需要清理阶段才能解析的 JSONC 输入及期望结果（严格 json.loads 均会失败）
+JSONC_CASES = [
+    # 行首的 // # /* */ 注释
+    ('{\n// comment\n"a": 1,\n# hash comment\n/* block\n comment */\n"b": [1, 2]\n}', {'a': 1, 'b': [1, 2]}),
+    # 行尾的注释
+    ('{"a": 1, // comment\n "b": 2, # hash\n "c": 3 /* block */}', {'a': 1, 'b': 2, 'c': 3}),
+    # 对象与数组中的尾随逗号
+    ('{"a": [1, 2,], "b": {"c": 1,},}', {'a': [1, 2], 'b': {'c': 1}}),
+    # 注释后的尾随逗号、尾随逗号后的注释
+    ('{"a": 1,/*x*/}', {'a': 1}),
+    ('[1, 2, // tail\n]', [1, 2]),
+    # 字符串中的原始换行符被去除（与旧逻辑一致）
+    ('{"a": "line1\nline2", "b": "x\r\ny"}', {'a': 'line1line2', 'b': 'xy'}),
+    # 字符串中的 // # /* 与转义引号原样保留
+    ('{"u": "http://x/#a", "q": "\\"//\\"", "c": "/* not a comment */", "h": "#tag", // real\n}',
+     {'u': 'http://x/#a', 'q': '"//"', 'c': '/* not a comment */', 'h': '#tag'}),
+    # BOM
+    ('\ufeff{"a": 1, // comment\n}', {'a': 1}),
+    ('\ufeff{"a": 1}', {'a': 1}),
+]
+
+# 清理后仍然非法、必须抛出 ValueError 的输入
+JSONC_INVALID_CASES = [
+    '{"a": "unterminated, // comment\n}',
+    '{"a": 1 /* unterminated block comment',
+    '{"a": 1,, // comment\n}',
+]
+
+
+def test_parse_jsonc_cleanup_cases():
+    """
+    parse_jsonc 的清理阶段（注释、尾随逗号、字符串中的换行）得到固定的期望结果，非法输入仍然报错
+    """
+    for text, expected in JSONC_CASES:
+        try:
+            json.loads(text)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"用例未经过清理阶段: {text!r}")
+        assert dump(merge_sources.parse_jsonc(text)) == dump(expected), text
+    for text in JSONC_INVALID_CASES:
+        try:
+            merge_sources.parse_jsonc(text)
+        except ValueError:
+            continue
+        raise AssertionError(f"非法输入未报错: {text!r}")
+
+
+def test_parse_jsonc_matches_json_loads():
+    """
+    仓库中严格 json.loads 可以解析的 JSON 文件，parse_jsonc 的结果与其一致
+    """
+    checked = 0
+    for dir_path, dir_names, file_names in os.walk(REPO_ROOT):
+        dir_names[:] = [name for name in dir_names if name != '.git']
+        for file_name in file_names:
+            if not file_name.endswith('.json'):
+                continue
+            with open(os.path.join(dir_path, file_name), 'r', encoding='utf-8-sig') as f:
+                text = f.read()
+            try:
+                expected = json.loads(text)
+            except ValueError:
+                continue
+            assert dump(merge_sources.parse_jsonc(text)) == dump(expected), file_name
+            checked += 1
+    assert checked > 0
+
+
+def main():
+    tests = [value for name, value in list(globals().items()) if name.startswith('test_') and callable(value)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"[Test] {test.__name__}: 通过")
+        except AssertionError as e:
+            failed += 1
+            print(f"[Error] {test.__name__}: 失败 {e}")
+    print(f"[Test] 共 {len(tests)} 项，失败 {failed} 项")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())